@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+
+from catalog import feedcache, tasks
+from catalog.models import Book, Loan
+
+
+# Deleting a user (delete_profile). The books lent to the deleted user stay with their
+# owners as lent to a non-user, and the books the deleted user had lent out stay with
+# the borrowers, as borrowed from a non-user: both are single UPDATEs. The rest is the
+# cascade of User.delete(). Accounts with more than CATALOG_ACCOUNT_DELETE_SYNC_LIMIT
+# books (default 500) are deactivated right away and deleted in the background, their
+# books in batches. The progress is read from the database (the books left and whether
+# the user still exists), so any worker process can show it. The deletion itself runs
+# in the in-process pool of tasks.py: if that process stops before it finishes, the
+# user stays deactivated with the rest of the books, and delete_account() has to be
+# run again (e.g. from the shell) to finish it.
+
+BATCH_SIZE = 500
+
+PROGRESS_TIMEOUT = 60 * 60
+
+
+def progress_token(user_id, total):
+    return signing.dumps([user_id, total], salt='catalog.accounts')
+
+
+def progress(token):
+    # {'done': ..., 'total': ..., 'finished': ...} or None for an invalid/expired token
+    try:
+        user_id, total = signing.loads(token, salt='catalog.accounts', max_age=PROGRESS_TIMEOUT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not User.objects.filter(pk=user_id).exists():
+        return {'done': total, 'total': total, 'finished': True}
+    left = Book.objects.filter(owner_id=user_id).count()
+    return {'done': max(total - left, 0), 'total': total, 'finished': False}
+
+
+def hand_over_books(user):
+    with transaction.atomic():
+        # the deleted user's borrowed books:
+        Book.objects.filter(borrower=user).update(borrower=None, borrower_nonuser=user.username)
+        Loan.objects.filter(borrower=user).update(borrower=None, borrower_nonuser=user.username)
+        # the deleted user's loaned books:
+        books_loaned = Book.objects.filter(owner=user, borrower__isnull=False)
+        borrower_ids = set(books_loaned.values_list('borrower_id', flat=True))
+        books_loaned.update(owner=F('borrower'), borrower=None, owner_nonuser=user.username, recommended=False, loaned=False)
+        transaction.on_commit(lambda: feedcache.bump(user.pk, *borrower_ids))
+
+
+def delete_account(user_id):
+    user = User.objects.get(pk=user_id)
+    hand_over_books(user)      # already done by request_deletion(), unless it is run again
+    books = Book.objects.filter(owner=user)
+    while True:
+        batch = list(books.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        with transaction.atomic():
+            Book.objects.filter(pk__in=batch).delete()
+    user.delete()
+
+
+def request_deletion(user):
+    # None: deleted now, else the progress_token() of the deletion in the background
+    with transaction.atomic():
+        hand_over_books(user)
+        book_count = Book.objects.filter(owner=user).count()
+        if book_count <= getattr(settings, 'CATALOG_ACCOUNT_DELETE_SYNC_LIMIT', 500):
+            user.delete()
+            return None
+        User.objects.filter(pk=user.pk).update(is_active=False)
+    tasks.submit(delete_account, user.pk)
+    return progress_token(user.pk, book_count)
@@ -2,7 +2,8 @@ from django.contrib import admin
 
 
 
-from .models import Genre, Language, Book, FriendRequest, Friendship, RejectedFriendship, Profile
+from .models import Genre, Language, Book, FriendRequest, Friendship, RejectedFriendship, Profile, TimingBucket, Loan, Notification
+from . import notifications
 
 admin.site.register(Genre)
 admin.site.register(Language)
@@ -30,3 +31,28 @@ class FriendshipAdmin(admin.ModelAdmin):
 class RejectedFriendshipAdmin(admin.ModelAdmin):
     list_display = ('rejecter', 'rejected', 'rejection_datetime', 'notif_deleted')
     list_filter = ('rejecter', 'rejected')
+
+
+@admin.register(TimingBucket)
+class TimingBucketAdmin(admin.ModelAdmin):
+    list_display = ('url_name', 'metric', 'label', 'count')
+    list_filter = ('metric', 'url_name')
+
+
+@admin.register(Loan)
+class LoanAdmin(admin.ModelAdmin):
+    list_display = ('book', 'owner', 'borrower', 'borrower_nonuser', 'loan_date', 'returned_at')
+    list_filter = ('owner',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'kind', 'actor', 'created')
+    list_filter = ('kind',)
+
+    # through notifications.delete(), so that the unread counters follow
+    def delete_model(self, request, obj):
+        notifications.delete(Notification.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        notifications.delete(queryset)
@@ -0,0 +1,295 @@
+import datetime
+import hashlib
+import json
+import math
+from functools import wraps
+from operator import attrgetter
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+from catalog import collation, feedcache, friends, friendships, notifications
+from catalog.feeds import FriendFeed
+from catalog.forms import BookCreateForm, FriendRequestForm
+from catalog.models import Book, FriendRequest, Notification
+from catalog.pagination import opaque_cursor_page
+
+
+# JSON API (for the mobile client) over the user's books, the friend feeds and the
+# friendships, with the session login and the CSRF token of the pages. The books are
+# validated by BookCreateForm (genre and language by id, borrower by username; PATCH
+# changes only the fields sent), the friend requests by FriendRequestForm.
+#
+# The lists are cursor paginated: ?after=<next of the previous page> (the opaque sort
+# key of its last row, see pagination.py), ?limit= (at most MAX_PAGE_SIZE), and
+# ?fields=title,owner,... returns only the given fields. The GET responses carry an ETag (and Last-Modified) made of
+# the feed versions (see feedcache.py) of the users in the response, so an unchanged
+# list answers 304 before any book is read.
+
+PAGE_SIZE = 50
+
+MAX_PAGE_SIZE = 200
+
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _error(status, message, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def api_view(*methods):
+    # JSON errors instead of the login redirect and the error pages
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return _error(401, 'Bejelentkezés szükséges.')
+            if request.method not in methods:
+                response = _error(405, 'Nem támogatott metódus.')
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return _error(error.status, error.message)
+            except (Http404, ObjectDoesNotExist):
+                return _error(404, 'Nem található.')
+        return wrapper
+    return decorator
+
+
+def _conditional(user_ids):
+    # ETag and Last-Modified of the GET responses; user_ids(request, ...) are the users
+    # whose feed versions cover everything in the response
+    def etag(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and request.user.is_authenticated:
+            digest = feedcache.digest(user_ids(request, *args, **kwargs))
+            return hashlib.md5(f'{digest}:{request.get_full_path()}'.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and request.user.is_authenticated:
+            version = max(version for user_id, version in feedcache.versions(user_ids(request, *args, **kwargs)))
+            # HTTP dates are in seconds, rounded up so that the header is never older than the change
+            return datetime.datetime.fromtimestamp(math.ceil(version / 10 ** 9), datetime.timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def _own_ids(request, *args, **kwargs):
+    return [request.user.pk]
+
+
+def _friend_ids(request, *args, **kwargs):
+    return {request.user.pk, *friends.friend_ids(request.user)}
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Érvénytelen JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'JSON objektumot kell küldeni.')
+    return data
+
+
+# serialization
+
+def _date(name):
+    return lambda obj: getattr(obj, name) and getattr(obj, name).isoformat()
+
+
+def _choice(name):
+    return lambda obj: getattr(obj, f'{name}_id') and {'id': getattr(obj, f'{name}_id'), 'name': getattr(obj, name).name}
+
+
+def _username(name):
+    return lambda obj: getattr(obj, f'{name}_id') and getattr(obj, name).username
+
+
+BOOK_FIELDS = {
+    'id': lambda book: str(book.book_id),
+    'last_name_author': attrgetter('last_name_author'),
+    'first_name_author': attrgetter('first_name_author'),
+    'title': attrgetter('title'),
+    'genre': _choice('genre'),
+    'language': _choice('language'),
+    'recommended': attrgetter('recommended'),
+    'wished': attrgetter('wished'),
+    'loaned': attrgetter('loaned'),
+    'borrower': _username('borrower'),
+    'borrower_nonuser': attrgetter('borrower_nonuser'),
+    'loan_date': _date('loan_date'),
+    'comment': attrgetter('comment'),
+}
+
+# what the friends see of a book (no comment, no borrower)
+FEED_FIELDS = {
+    **{name: BOOK_FIELDS[name] for name in ('id', 'last_name_author', 'first_name_author', 'title', 'genre', 'language', 'loaned', 'loan_date')},
+    'owner': _username('owner'),
+}
+
+
+def _fields(request, available):
+    names = request.GET.get('fields')
+    if not names:
+        return available
+    names = names.split(',')
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(400, f'Ismeretlen mező: {", ".join(unknown)}')
+    return {name: available[name] for name in names}
+
+
+def _serialize(obj, fields):
+    return {name: value(obj) for name, value in fields.items()}
+
+
+def _user(user):
+    return {'username': user.username, 'last_name': user.last_name, 'first_name': user.first_name, 'avatar': user.profile.avatar_url}
+
+
+def _page(request, queryset, fields, extra=None):
+    try:
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError(400, 'Érvénytelen limit.')
+    fields = _fields(request, fields)
+    rows, next_cursor = opaque_cursor_page(queryset, request.GET.get('after', ''), max(limit, 1))
+    results = []
+    for row in rows:
+        result = _serialize(row, fields)
+        if extra is not None:
+            result.update(extra(row))
+        results.append(result)
+    return JsonResponse({'results': results, 'next': next_cursor})
+
+
+# I. BOOKS
+
+def own_books(user):
+    return (Book.objects.filter(owner=user, owner_nonuser__isnull=True).select_related('genre', 'language', 'borrower')
+            .order_by('sort_key', 'book_id'))
+
+
+def _book_form(request, data, instance=None):
+    form = BookCreateForm(request.user, data, instance=instance)
+    form.fields['borrower'].to_field_name = 'username'
+    return form
+
+
+def _book_data(book):
+    # the form data of a saved book, under the fields of a PATCH
+    data = {name: getattr(book, name) for name in ('last_name_author', 'first_name_author', 'title', 'recommended', 'wished', 'loaned', 'borrower_nonuser', 'comment')}
+    data.update(genre=book.genre_id, language=book.language_id, borrower=book.borrower and book.borrower.username,
+                loan_date=book.loan_date and book.loan_date.isoformat())
+    return {name: value for name, value in data.items() if value is not None}
+
+
+def _save_book(form, status=200):
+    if not form.is_valid():
+        return _error(400, 'Érvénytelen adatok.', errors=form.errors.get_json_data())
+    book = form.save()
+    return JsonResponse(_serialize(book, BOOK_FIELDS), status=status)
+
+
+@api_view('GET', 'POST')
+@_conditional(_own_ids)
+def books(request):
+    if request.method == 'POST':
+        form = _book_form(request, _json_body(request))
+        form.instance.owner = request.user
+        return _save_book(form, status=201)
+    return _page(request, own_books(request.user), BOOK_FIELDS)
+
+
+@api_view('GET', 'PUT', 'PATCH', 'DELETE')
+@_conditional(_own_ids)
+def book(request, pk):
+    book = get_object_or_404(own_books(request.user), pk=pk)
+    if request.method == 'GET':
+        return JsonResponse(_serialize(book, _fields(request, BOOK_FIELDS)))
+    if request.method == 'DELETE':
+        book.delete()
+        return HttpResponse(status=204)
+    data = _json_body(request)
+    if request.method == 'PATCH':
+        data = {**_book_data(book), **data}
+    return _save_book(_book_form(request, data, instance=book))
+
+
+@api_view('GET')
+@_conditional(_friend_ids)
+def feed(request, flag):
+    try:
+        friend_feed = FriendFeed(flag, group_by=request.GET.get('group_by') or None, order=request.GET.get('order', 'author'))
+    except ValueError as error:
+        raise ApiError(400, str(error))
+    extra = None
+    if friend_feed.group_by is not None:
+        extra = lambda book: {'group': str(getattr(book, friend_feed.group_by))}
+    return _page(request, friend_feed.books(request.user), FEED_FIELDS, extra)
+
+
+# II. FRIENDS
+
+@api_view('GET')
+@_conditional(_friend_ids)
+def friend_list(request):
+    users = User.objects.filter(id__in=friends.friend_ids(request.user)).select_related('profile')
+    return JsonResponse({'results': [_user(user) for user in collation.sort_objects(users, lambda user: user.username)]})
+
+
+@api_view('DELETE')
+def friend(request, username):
+    friendships.unfriend(request.user, get_object_or_404(User, username=username))
+    return HttpResponse(status=204)
+
+
+@api_view('GET', 'POST')
+def friend_requests(request):
+    if request.method == 'POST':
+        form = FriendRequestForm(request.user, {'requested_friend': _json_body(request).get('username')})
+        if not form.is_valid():
+            return _error(400, 'Érvénytelen adatok.', errors=form.errors.get_json_data())
+        friendships.send_request(request.user, form.cleaned_data['requested_friend'])
+        return JsonResponse(_user(form.cleaned_data['requested_friend']), status=201)
+
+    received = notifications.unread(request.user)[Notification.FRIEND_REQUEST]
+    sent = FriendRequest.objects.filter(user=request.user, confirmed_request=False).select_related('requested_friend__profile')
+    return JsonResponse({
+        'received': [{**_user(item.actor), 'date': item.created.isoformat()} for item in received],
+        'sent': [{**_user(item.requested_friend), 'date': item.request_datetime.isoformat()} for item in sent],
+    })
+
+
+@api_view('DELETE')
+def friend_request(request, username):
+    friendships.withdraw(request.user, get_object_or_404(User, username=username))
+    return HttpResponse(status=204)
+
+
+@api_view('POST')
+def friend_request_answer(request, username, answer):
+    requester = get_object_or_404(User, username=username)
+    if answer == 'confirm':
+        try:
+            friendships.confirm(request.user, requester)
+        except IntegrityError:
+            raise ApiError(409, 'Már barátok vagytok.')
+    elif answer == 'reject':
+        friendships.reject(request.user, requester)
+    else:
+        raise Http404
+    return HttpResponse(status=204)
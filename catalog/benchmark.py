@@ -0,0 +1,163 @@
+import math
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog import collation, friends, urls
+from catalog.models import Book, FriendRequest
+
+
+# Requests every GET page of catalog/urls.py as one user with the test client and
+# measures the latency (p50/p95 of the repeated requests, after one warm-up request),
+# the number of queries and the peak Python memory of a request (with tracemalloc, in
+# an extra request, so the tracing doesn't distort the timings). The result is a plain
+# dict, written as JSON by the bench_views command, so two runs can be diffed.
+
+
+def default_user():
+    # the user with the most friends: their feeds are the heaviest pages
+    return User.objects.annotate(friend_count=Count('friend_edges')).order_by('-friend_count', 'id').first()
+
+
+def url_kwargs(user):
+    book = Book.objects.filter(owner=user, owner_nonuser__isnull=True).first()
+    nonuser_book = Book.objects.filter(owner=user, owner_nonuser__isnull=False).first()
+    friend = User.objects.filter(id__in=friends.friend_ids(user)).order_by('id').first()
+    friend_request = FriendRequest.objects.filter(user=user, confirmed_request=False).first()
+    # URL name -> kwargs, None when the user has nothing to show on that page
+    return {
+        'book-detail': book and {'pk': book.pk},
+        'book-update': book and {'pk': book.pk},
+        'book-delete': book and {'pk': book.pk},
+        'book-of-nonuser-update': nonuser_book and {'pk': nonuser_book.pk},
+        'book-of-nonuser-delete': nonuser_book and {'pk': nonuser_book.pk},
+        'delete-friend': friend and {'pk': friend.pk},
+        'withdraw-request': friend_request and {'pk': friend_request.requested_friend_id},
+        'friend-recom-books': friend and {'username': friend.username},
+        'friend-wished-books': friend and {'username': friend.username},
+        'api-book': book and {'pk': book.pk},
+        'api-feed': {'flag': 'recommended'},
+    }
+
+
+# URL name -> why it isn't requested. The live update endpoints are not pages: the
+# event stream is held open (or answers 204 without the ASGI middleware), the poll is
+# requested by a timer of the page. The API endpoints of the friendships only answer
+# DELETE or POST, and a deletion progress page exists only while a deletion runs.
+
+SKIPPED = {
+    'live-events': 'live update endpoint',
+    'live-poll': 'live update endpoint',
+    'api-friend': 'no GET method',
+    'api-friend-request': 'no GET method',
+    'api-friend-request-answer': 'no GET method',
+    'account-deletion-progress': 'only while an account deletion runs',
+}
+
+
+class QueryCounter:
+    # an execute wrapper: unlike connection.queries it works with DEBUG = False, and it
+    # isn't reset by the request_started signal
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _get(client, path):
+    response = client.get(path)
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+    return response
+
+
+def measure(client, path, repeat, clear_cache=False):
+    if clear_cache:
+        cache.clear()
+    response = _get(client, path)          # warm-up
+
+    timings = []
+    for _ in range(repeat):
+        if clear_cache:
+            cache.clear()
+        start = time.perf_counter()
+        _get(client, path)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    if clear_cache:
+        cache.clear()
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        _get(client, path)
+
+    if clear_cache:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        _get(client, path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'path': path,
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': queries.count,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(user, repeat=20, names=None, clear_cache=False):
+    kwargs = url_kwargs(user)
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        client = Client()
+        client.force_login(user)
+        for pattern in urls.urlpatterns:
+            if names and pattern.name not in names:
+                continue
+            if pattern.name in SKIPPED:
+                results[pattern.name] = {'skipped': SKIPPED[pattern.name]}
+                continue
+            if pattern.pattern.converters:
+                if not kwargs.get(pattern.name):
+                    results[pattern.name] = {'skipped': 'no object for the URL parameters'}
+                    continue
+                path = reverse(pattern.name, kwargs=kwargs[pattern.name])
+            else:
+                path = reverse(pattern.name)
+            results[pattern.name] = measure(client, path, repeat, clear_cache=clear_cache)
+    return {
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'user': user.username,
+        'friends': len(friends.friend_ids(user)),
+        'books': Book.objects.filter(owner=user).count(),
+        'repeat': repeat,
+        'cache_cleared': clear_cache,
+        'collation_cache': collation.cache_info()._asdict(),
+        'endpoints': results,
+    }
@@ -0,0 +1,83 @@
+import functools
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+
+from pyuca import Collator
+
+from catalog import profiling
+
+
+# Building the Collator parses the whole DUCET table (about a second and 10 MB), so it
+# is only done when the first key is needed, not when the module is imported (migrate,
+# admin commands). CATALOG_COLLATION_TABLE can point to a trimmed table made by the
+# build_collation_table command: it only has the Latin scripts, so it loads in a
+# fraction of the time and memory, and gives the same keys for the Latin texts (other
+# characters get the implicit weights of the collation algorithm).
+
+_collator = None
+
+
+def get_collator():
+    global _collator
+    if _collator is None:
+        _collator = Collator(getattr(settings, 'CATALOG_COLLATION_TABLE', None))
+    return _collator
+
+
+# The same author names and titles (and usernames, genres, languages) come up again
+# and again, so the keys of the strings are cached per process. CATALOG_COLLATION_CACHE_SIZE
+# strings (default 50000) are kept, the least recently used ones are dropped.
+
+@functools.lru_cache(maxsize=getattr(settings, 'CATALOG_COLLATION_CACHE_SIZE', 50000))
+def string_key(value):
+    return ''.join(f'{weight:04x}' for weight in get_collator().sort_key(value))
+
+
+def cache_info():
+    return string_key.cache_info()
+
+
+# pyuca weights always fit into four hex digits, so the fixed-width hex form of a
+# sort key compares (as a plain string, in the database) exactly like the key tuple.
+# The components of a compound key are joined by a space, which sorts below every
+# hex digit, so (last name, first name, title) keeps its tuple order as well.
+
+@profiling.timed('collation')
+def sort_key(*values):
+    return ' '.join(string_key(value or '') for value in values)
+
+
+@profiling.timed('collation')
+def sort_objects(objects, label):
+    return sorted(objects, key=lambda obj: string_key(label(obj)))
+
+
+# Ranks a small set of related objects (friends, languages, genres) in Python and
+# turns the ranking into a CASE expression, so the database can order by it.
+
+def collation_rank(field, objects, label):
+    ordered = sort_objects(objects, label)
+    whens = [When(**{field: obj.pk}, then=Value(rank)) for rank, obj in enumerate(ordered)]
+    return Case(*whens, default=Value(len(ordered)), output_field=IntegerField())
+
+
+# 'Jókai Mór' -> 'jokai mor': accents (and case) are folded away, for the search and
+# for the work keys below
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+# Two copies of the same book have the same work key, however their owners typed the
+# names: punctuation and spacing are folded away as well ('Jókai, Mór: Az arany ember!'
+# and 'jokai mor - az  arany ember' match).
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def work_key(last_name, first_name, title):
+    return '|'.join(' '.join(WORD_PATTERN.findall(fold(value or ''))) for value in (last_name, first_name, title))
@@ -0,0 +1,94 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+
+from catalog import friends
+
+
+# Every user has a feed version in the cache. It is bumped (see signals.py) when one of
+# their books changes, when their profile changes and when they gain or lose a friend.
+# A cached feed page is keyed by the versions of the viewer and of all the users whose
+# books are on the page, so any of those changes makes the old entries unreachable and
+# they simply expire. Versions are timestamps, so an evicted version never comes back
+# with an old value.
+
+def _version_key(user_id):
+    return f'catalog:feedver:{user_id}'
+
+
+def bump(*users):
+    version = time.time_ns()
+    cache.set_many({_version_key(getattr(user, 'pk', user)): version for user in users}, None)
+
+
+def versions(user_ids):
+    keys = {_version_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return sorted((keys[key], version) for key, version in found.items())
+
+
+def digest(user_ids):
+    return hashlib.md5(repr(versions(user_ids)).encode()).hexdigest()
+
+
+
+class _CachedRows:
+    # stands in for the full queryset: the paginator only needs its length and the current page
+
+    def __init__(self, count, rows):
+        self.count = count
+        self.rows = rows
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.rows
+
+
+
+class FeedCacheMixin:
+    # Caches one page (or cursor page) of a friend feed per viewer. Must come before
+    # KeysetPaginationMixin, so that cursor pages are cached as well.
+
+    def get_feed_owner_ids(self):
+        return friends.friend_ids(self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        owner_ids = {request.user.pk, *self.get_feed_owner_ids()}
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        self.feed_cache_key = f'catalog:feed:{request.user.pk}:{path}:{digest(owner_ids)}'
+        self.feed_cache_hit = cache.get(self.feed_cache_key)
+        if self.feed_cache_hit is None:
+            return super().get(request, *args, **kwargs)
+
+        # cache hit: the queryset of the view is not even built
+        self.object_list = self.model.objects.none()
+        return self.render_to_response(self.get_context_data())
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.feed_cache_hit is None:
+            paginator, page, rows, is_paginated = super().paginate_queryset(queryset, page_size)
+            rows = list(rows)
+            if page is not None:
+                page.object_list = rows
+            if paginator is None:
+                self.feed_cache_hit = (None, None, rows, getattr(self, 'next_cursor', None))
+            else:
+                self.feed_cache_hit = (paginator.count, page.number, rows, None)
+            cache.set(self.feed_cache_key, self.feed_cache_hit, getattr(settings, 'CATALOG_FEED_CACHE_TIMEOUT', 600))
+            return (paginator, page, rows, is_paginated)
+
+        count, number, rows, self.next_cursor = self.feed_cache_hit
+        if count is None:
+            return (None, None, rows, False)
+        paginator = Paginator(_CachedRows(count, rows), page_size, orphans=self.get_paginate_orphans(), allow_empty_first_page=self.get_allow_empty())
+        page = paginator.page(number)
+        return (paginator, page, page.object_list, page.has_other_pages())
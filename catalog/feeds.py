@@ -0,0 +1,49 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from catalog import collation, friends
+from catalog.models import Book, Genre, Language
+
+
+# A friend feed is the recommended or wished books of the user's friends, optionally
+# grouped by owner, language or genre, in one of the orderings below. Everything is
+# done in a single query: groups are ranked by a CASE expression (collation order of
+# the owner/language/genre names) and the books inside the groups by the stored keys.
+
+GROUPINGS = {
+    'owner': (lambda friend_ids: User.objects.filter(id__in=friend_ids), lambda x: x.username),
+    'language': (lambda friend_ids: Language.objects.all(), lambda x: x.name),
+    'genre': (lambda friend_ids: Genre.objects.all(), lambda x: x.name),
+}
+
+ORDERINGS = {
+    'author': ({}, ['sort_key', 'book_id']),
+    'loan_date': ({'loan_day': Coalesce('loan_date', Value(datetime.date.min))}, ['-loan_day', 'sort_key', 'book_id']),
+}
+
+
+class FriendFeed:
+
+    def __init__(self, flag, group_by=None, order='author'):
+        if flag not in ('recommended', 'wished'):
+            raise ValueError(f'Unknown feed flag: {flag}')
+        if group_by is not None and group_by not in GROUPINGS:
+            raise ValueError(f'Unknown feed grouping: {group_by}')
+        if order not in ORDERINGS:
+            raise ValueError(f'Unknown feed ordering: {order}')
+        self.flag = flag
+        self.group_by = group_by
+        self.order = order
+
+    def books(self, user):
+        friend_ids = friends.friend_ids(user)
+        books = Book.objects.for_listing().filter(owner__id__in=friend_ids).filter(**{self.flag: True})
+        annotations, ordering = ORDERINGS[self.order]
+        if self.group_by is not None:
+            objects, label = GROUPINGS[self.group_by]
+            annotations = {'group_rank': collation.collation_rank(self.group_by, objects(friend_ids), label), **annotations}
+            ordering = ['group_rank'] + ordering
+        return books.annotate(**annotations).order_by(*ordering)
\ No newline at end of file
@@ -8,9 +8,8 @@ from django.forms import ModelForm, ModelChoiceField
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 
-from catalog.models import FriendRequest, Friendship, Book, Profile
-
-from django.db.models import Q
+from catalog.models import FriendRequest, Book, Profile
+from catalog import friends, suggestions
 
 
 class UserModelChoiceField(ModelChoiceField):
@@ -33,10 +32,15 @@ class FriendRequestForm(ModelForm):
         labels = {'requested_friend': _('Lehetséges barátok')}
 
 
+    # a text input with autocomplete (see friend_autocomplete.js) instead of a dropdown of
+    # every user: the queryset is only used to look up the one username that is sent
     def __init__(self, user, *args, **kwargs):
         super(FriendRequestForm, self).__init__(*args, **kwargs)
-        self.fields['requested_friend'].queryset = User.objects.exclude(username=user).exclude(requested_friend__user=user).exclude(request_user__requested_friend=user).order_by('username')
-        self.fields['requested_friend'].empty_label = 'Válassz barátot'
+        field = self.fields['requested_friend']
+        field.queryset = User.objects.exclude(id__in=suggestions.related_ids(user))
+        field.to_field_name = 'username'
+        field.widget = forms.TextInput(attrs={'list': 'friend-autocomplete', 'autocomplete': 'off', 'placeholder': 'Felhasználónév vagy név'})
+        field.error_messages['invalid_choice'] = 'Nincs ilyen felhasználó, vagy már kapcsolatban vagytok.'
         
 
 
@@ -46,6 +50,37 @@ class DateInput(forms.DateInput):
     
     
 
+# the rules of the recommended/wished/loaned flags, shared by BookCreateForm and the book importer
+
+def check_book_flags(cleaned_data):
+    recom = cleaned_data.get('recommended')
+    wished = cleaned_data.get('wished')
+    loaned = cleaned_data.get('loaned')
+    borrower = cleaned_data.get('borrower')
+    borrower_nonuser = cleaned_data.get('borrower_nonuser')
+    loan_date = cleaned_data.get('loan_date')
+
+    # main.js takes care of some of these things, hopefully...
+    if wished == True:
+        if recom == True:
+            raise forms.ValidationError("Nem lehet egyszerre ajánlani és kívánságlistára tenni ugyanazt a könyvet.") 
+        elif loaned == True:
+            raise forms.ValidationError("Kívánságlistán szereplő könyvet nem lehet kölcsönadni.")
+
+    if loaned == True:
+        if borrower == None and borrower_nonuser == None:
+            raise forms.ValidationError("Meg kell adnod, hogy kinek adtad kölcsön.")
+        elif loan_date == None:
+            raise forms.ValidationError("Meg kell adnod, hogy mikor adtad kölcsön.")
+        elif recom == False:
+            raise forms.ValidationError("Csak ajánlott könyvet lehet kölcsönadni.")
+    
+    if loaned == False:
+        if borrower != None or borrower_nonuser != None or loan_date != None:
+            raise forms.ValidationError('Ha nincs kölcsönadva a könyv, akkor nem lehet személyt és időpontot megadni.')
+
+
+
 class BookCreateForm(ModelForm):
 
     class Meta:
@@ -59,37 +94,13 @@ class BookCreateForm(ModelForm):
     
     def __init__(self, user, *args, **kwargs):
         super(BookCreateForm, self).__init__(*args, **kwargs)
-        self.fields['borrower'].queryset = User.objects.exclude(username=user).filter(Q(confirmed_user__requested_user=user) | Q(requested_user__confirmed_user=user)).distinct().order_by('username')
+        self.fields['borrower'].queryset = User.objects.filter(id__in=friends.friend_ids(user)).order_by('username')
         self.fields['borrower'].empty_label = 'Válassz a barátaid közül'
        
 
     def clean(self):
         cleaned_data = super().clean()
-        recom = cleaned_data.get('recommended')
-        wished = cleaned_data.get('wished')
-        loaned = cleaned_data.get('loaned')
-        borrower = cleaned_data.get('borrower')
-        borrower_nonuser = cleaned_data.get('borrower_nonuser')
-        loan_date = cleaned_data.get('loan_date')
-
-        # main.js takes care of some of these things, hopefully...
-        if wished == True:
-            if recom == True:
-                raise forms.ValidationError("Nem lehet egyszerre ajánlani és kívánságlistára tenni ugyanazt a könyvet.") 
-            elif loaned == True:
-                raise forms.ValidationError("Kívánságlistán szereplő könyvet nem lehet kölcsönadni.")
-
-        if loaned == True:
-            if borrower == None and borrower_nonuser == None:
-                raise forms.ValidationError("Meg kell adnod, hogy kinek adtad kölcsön.")
-            elif loan_date == None:
-                raise forms.ValidationError("Meg kell adnod, hogy mikor adtad kölcsön.")
-            elif recom == False:
-                raise forms.ValidationError("Csak ajánlott könyvet lehet kölcsönadni.")
-        
-        if loaned == False:
-            if borrower != None or borrower_nonuser != None or loan_date != None:
-                raise forms.ValidationError('Ha nincs kölcsönadva a könyv, akkor nem lehet személyt és időpontot megadni.') 
+        check_book_flags(cleaned_data)
 
 
 
@@ -105,6 +116,17 @@ class BookOfNonUserCreateForm(ModelForm):
 
 
 
+class BookImportForm(forms.Form):
+    file = forms.FileField(label='Fájl', help_text='CSV (fejléccel), JSON vagy NDJSON (JSONL) fájl.')
+
+    def clean_file(self):
+        uploaded_file = self.cleaned_data['file']
+        if not uploaded_file.name.lower().endswith(('.csv', '.json', '.ndjson', '.jsonl')):
+            raise forms.ValidationError('Csak CSV, JSON vagy NDJSON (JSONL) fájlt lehet feltölteni.')
+        return uploaded_file
+
+
+
 class RequestManagementForm(forms.Form):
     user_to_handle = forms.CharField(max_length=50)
    
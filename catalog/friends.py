@@ -0,0 +1,24 @@
+from django.core.cache import cache
+
+from catalog.models import FriendEdge
+
+
+# The friend ids of every user are cached as a set, so the views don't have to hit
+# the friendship tables on each request. The cache entry is dropped by the
+# Friendship signals (see signals.py) whenever a friendship is created or deleted.
+
+def _cache_key(user_id):
+    return f'catalog:friends:{user_id}'
+
+
+def friend_ids(user):
+    user_id = getattr(user, 'pk', user)
+    ids = cache.get(_cache_key(user_id))
+    if ids is None:
+        ids = frozenset(FriendEdge.objects.filter(user=user_id).values_list('friend', flat=True))
+        cache.set(_cache_key(user_id), ids, None)
+    return ids
+
+
+def invalidate(*users):
+    cache.delete_many([_cache_key(getattr(user, 'pk', user)) for user in users])
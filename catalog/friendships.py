@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import Q
+
+from catalog.models import FriendRequest, Friendship, RejectedFriendship
+
+
+# The friendship actions, shared by the pages (views.py) and the JSON API (api.py).
+# user is the one acting; a missing request or friendship raises DoesNotExist, and
+# confirming a request twice raises IntegrityError (the friendship already exists).
+
+def send_request(user, requested_friend):
+    return FriendRequest.objects.create(user=user, requested_friend=requested_friend)
+
+
+def confirm(user, requester):
+    with transaction.atomic():
+        Friendship(confirmed_user=requester, requested_user=user).save()
+        friend_request = FriendRequest.objects.get(user=requester, requested_friend=user)
+        friend_request.confirmed_request = True
+        friend_request.save()
+
+
+def reject(user, requester):
+    with transaction.atomic():
+        FriendRequest.objects.get(user=requester, requested_friend=user).delete()
+        RejectedFriendship(rejecter=user, rejected=requester).save()
+
+
+def withdraw(user, requested_friend):
+    FriendRequest.objects.get(user=user, requested_friend=requested_friend).delete()
+
+
+def dismiss_rejection(user, rejecter):
+    for rejection in RejectedFriendship.objects.filter(rejecter=rejecter, rejected=user, notif_deleted=False):
+        rejection.notif_deleted = True    # purged later by compact_notifications
+        rejection.save()
+
+
+def unfriend(user, friend):
+    with transaction.atomic():
+        Friendship.objects.get(edges__user=user, edges__friend=friend).delete()
+        # the confirmed request may have been purged already (compact_notifications)
+        FriendRequest.objects.filter(Q(user=user, requested_friend=friend) | Q(user=friend, requested_friend=user)).delete()
@@ -0,0 +1,56 @@
+import os
+
+from django.core.files.storage import default_storage
+
+from PIL import Image
+
+
+# Profile pictures are kept as uploaded; the lists and the profile page use fixed size
+# copies, made in the background (see tasks.py) next to the original, in a thumbs/
+# directory. A copy is only made again when the original is newer than the copy.
+# Profile.thumbnails_ready tells when the copies are there, until then (a few seconds
+# after an upload) the pages show the original.
+
+SIZES = {
+    'avatar': 130,      # .friend-img is 65px, rendered at 2x
+    'profile': 300,
+}
+
+
+def thumbnail_name(image_name, size):
+    directory, filename = os.path.split(image_name)
+    root, ext = os.path.splitext(filename)
+    return os.path.join(directory, 'thumbs', f'{root}_{size}px{ext}')
+
+
+def thumbnail_url(image_name, size, ready):
+    return default_storage.url(thumbnail_name(image_name, size) if ready else image_name)
+
+
+def _is_fresh(source_path, target_path):
+    return os.path.exists(target_path) and os.path.getmtime(target_path) >= os.path.getmtime(source_path)
+
+
+def make_thumbnails(image_name):
+    source_path = default_storage.path(image_name)
+    targets = {size: default_storage.path(thumbnail_name(image_name, size)) for size in SIZES.values()}
+    targets = {size: path for size, path in targets.items() if not _is_fresh(source_path, path)}
+    if not targets:
+        return
+
+    with Image.open(source_path) as img:
+        img.load()
+        for size, path in targets.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            thumbnail = img.copy()
+            thumbnail.thumbnail((size, size))
+            if thumbnail.mode not in ('RGB', 'L') and path.lower().endswith(('.jpg', '.jpeg')):
+                thumbnail = thumbnail.convert('RGB')
+            thumbnail.save(path)
+
+
+def delete_thumbnails(image_name):
+    for size in SIZES.values():
+        name = thumbnail_name(image_name, size)
+        if default_storage.exists(name):
+            default_storage.delete(name)
@@ -0,0 +1,216 @@
+import csv
+import datetime
+import io
+import json
+
+from django import forms
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from catalog import feedcache, friends, search
+from catalog.forms import check_book_flags
+from catalog.models import Book, Genre, Language, Loan
+
+
+# Bulk book import from CSV (with a header row), JSON (an array of objects) or NDJSON.
+# Rows are read one by one from the stream, validated with the rules of BookCreateForm
+# and inserted with bulk_create in batches, so memory use doesn't depend on the file size.
+# The column names are the Book field names; genre and language are given by name,
+# borrower by the username of a friend. A row with owner_nonuser is a book borrowed
+# from a non-user (as in the export), loan_date is then the day it was borrowed.
+
+COLUMNS = ('last_name_author', 'first_name_author', 'title', 'genre', 'language', 'recommended', 'wished', 'loaned', 'borrower', 'borrower_nonuser', 'loan_date', 'comment', 'owner_nonuser')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'igen', 'i', 'x'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'nem', 'n'}
+
+MAX_REPORTED_ERRORS = 200
+
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_json(stream):
+    # objects of a JSON array or of a JSON lines file, decoded chunk by chunk
+    decoder = json.JSONDecoder()
+    buffer = stream.read(CHUNK_SIZE).lstrip()
+    array = buffer.startswith('[')
+    if array:
+        buffer = buffer[1:]
+    separators = ' \t\r\n,' if array else ' \t\r\n'
+    number = 0
+    eof = False
+    while True:
+        buffer = buffer.lstrip(separators)
+        if array and buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                number += 1
+                yield number, value
+                buffer = buffer[end:]
+                continue
+        elif eof:
+            return
+        chunk = stream.read(CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        return read_csv(stream)
+    if file_format in ('json', 'ndjson', 'jsonl'):
+        return read_json(stream)
+    raise ValueError(f'Unknown import format: {file_format}')
+
+
+def format_from_name(name):
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else 'csv'
+
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []      # (row number, message), at most MAX_REPORTED_ERRORS of them
+
+    def add_error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+
+
+class BookImporter:
+
+    def __init__(self, user, batch_size=500):
+        self.user = user
+        self.batch_size = batch_size
+        # lookup tables, so no query is needed per row
+        self.genres = {name.casefold(): pk for pk, name in Genre.objects.values_list('id', 'name')}
+        self.languages = {name.casefold(): pk for pk, name in Language.objects.values_list('id', 'name')}
+        self.borrowers = {username.casefold(): pk for pk, username in User.objects.filter(id__in=friends.friend_ids(user)).values_list('id', 'username')}
+
+    def _text(self, row, name, required=False):
+        value = row.get(name)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            raise forms.ValidationError(f'Hiányzó mező: {name}')
+        max_length = Book._meta.get_field(name).max_length
+        if max_length and len(value) > max_length:
+            raise forms.ValidationError(f'Túl hosszú mező: {name} (legfeljebb {max_length} karakter)')
+        return value
+
+    def _bool(self, row, name):
+        value = row.get(name)
+        if isinstance(value, bool):
+            return value
+        value = '' if value is None else str(value).strip().casefold()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise forms.ValidationError(f'Érvénytelen érték: {name}')
+
+    def _lookup(self, row, name, table):
+        value = '' if row.get(name) is None else str(row.get(name)).strip()
+        if not value:
+            return None
+        try:
+            return table[value.casefold()]
+        except KeyError:
+            raise forms.ValidationError(f'Ismeretlen érték: {name} ({value})')
+
+    def _date(self, row, name):
+        value = '' if row.get(name) is None else str(row.get(name)).strip()
+        if not value:
+            return None
+        for date_format in ('%Y-%m-%d', '%Y.%m.%d', '%Y.%m.%d.'):
+            try:
+                return datetime.datetime.strptime(value, date_format).date()
+            except ValueError:
+                pass
+        raise forms.ValidationError(f'Érvénytelen dátum: {name} ({value})')
+
+    def build_book(self, row):
+        if not isinstance(row, dict):
+            raise forms.ValidationError('A sor nem objektum.')
+        cleaned_data = {
+            'last_name_author': self._text(row, 'last_name_author', required=True),
+            'first_name_author': self._text(row, 'first_name_author', required=True),
+            'title': self._text(row, 'title', required=True),
+            'recommended': self._bool(row, 'recommended'),
+            'wished': self._bool(row, 'wished'),
+            'loaned': self._bool(row, 'loaned'),
+            'borrower': self._lookup(row, 'borrower', self.borrowers),
+            'borrower_nonuser': self._text(row, 'borrower_nonuser') or None,
+            'loan_date': self._date(row, 'loan_date'),
+            'comment': self._text(row, 'comment'),
+            'owner_nonuser': self._text(row, 'owner_nonuser') or None,
+        }
+        if cleaned_data['owner_nonuser'] is None:
+            check_book_flags(cleaned_data)
+        # a book borrowed from a non-user has only the fields of BookOfNonUserCreateForm
+        elif any(cleaned_data[name] for name in ('recommended', 'wished', 'loaned', 'borrower', 'borrower_nonuser')):
+            raise forms.ValidationError('Ismerőstől kapott könyvet nem lehet ajánlani, kölcsönadni vagy kívánságlistára tenni.')
+        elif cleaned_data['loan_date'] is None:
+            raise forms.ValidationError('Meg kell adnod, hogy mikor kaptad a könyvet.')
+
+        book = Book(owner=self.user, **{name: value for name, value in cleaned_data.items() if name != 'borrower'})
+        book.borrower_id = cleaned_data['borrower']
+        genre = self._lookup(row, 'genre', self.genres)
+        if genre is not None:
+            book.genre_id = genre
+        language = self._lookup(row, 'language', self.languages)
+        if language is not None:
+            book.language_id = language
+        book.refresh_keys()
+        return book
+
+    def _insert(self, books):
+        Book.objects.bulk_create(books)
+        Loan.objects.bulk_create([book.new_loan() for book in books if book.loaned])
+        search.get_index().add_many(books)
+
+    def run(self, rows):
+        result = ImportResult()
+        books = []
+        with transaction.atomic():
+            for number, row in rows:
+                try:
+                    books.append(self.build_book(row))
+                except forms.ValidationError as error:
+                    result.add_error(number, ' '.join(error.messages))
+                    continue
+                if len(books) == self.batch_size:
+                    self._insert(books)
+                    result.created += len(books)
+                    books = []
+            self._insert(books)
+            result.created += len(books)
+        if result.created:
+            feedcache.bump(self.user)
+        return result
+
+
+def import_books(user, stream, file_format, batch_size=500):
+    return BookImporter(user, batch_size=batch_size).run(read_rows(stream, file_format))
+
+
+def import_uploaded_file(user, uploaded_file):
+    # newline='' so that csv reads the line breaks inside quoted fields (e.g. a comment)
+    stream = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    return import_books(user, stream, format_from_name(uploaded_file.name))
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+
+
+# Live updates: the write paths (notifications.py, the Friendship and Loan signals)
+# publish events for a user, and the user's open pages get them as server-sent events,
+# without reloading. The pub/sub is in process (a stand-in for a channel layer): the
+# events reach the connections served by the same process, so the site has to run in
+# one ASGI process for the live updates to see every write. With nobody listening,
+# publish() is one dictionary lookup.
+#
+# The SSE endpoint needs the ASGI server, as a connection is held open for every user
+# (Django 3.0 has no async views): wrap the application in the project's asgi.py
+#
+#     application = LiveUpdatesMiddleware(get_asgi_application())
+#
+# Without it (WSGI, or several processes), the live-events URL answers 204 and the
+# pages fall back to a short poll of live-poll every POLL_INTERVAL seconds (see
+# live_updates.js): one indexed read of the unread counter, which is kept in the
+# database and so is right whichever process serves the request. The friendship and
+# loan events are only delivered over SSE.
+
+KEEPALIVE = 15
+
+POLL_INTERVAL = 30
+
+_subscribers = defaultdict(set)     # user id -> subscriptions
+_lock = threading.Lock()
+
+
+
+class _Subscription:
+    # an SSE connection: the events are handed over to its event loop
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:        # the loop is closed
+            pass
+
+
+
+def _subscribe(user_id, subscription):
+    with _lock:
+        _subscribers[user_id].add(subscription)
+    return subscription
+
+
+def _unsubscribe(user_id, subscription):
+    with _lock:
+        subscriptions = _subscribers.get(user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del _subscribers[user_id]
+
+
+def is_listening(user_id):
+    return user_id in _subscribers
+
+
+def publish(user_id, event, **data):
+    # may be called from any thread; best after the commit (transaction.on_commit)
+    with _lock:
+        subscriptions = list(_subscribers.get(user_id, ()))
+    for subscription in subscriptions:
+        subscription.put({'event': event, 'data': data})
+
+
+def unread_count(user_id):
+    from catalog.models import Profile     # this module is imported by asgi.py, maybe before the apps are ready
+    return Profile.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+def _session_user_id(session_key):
+    try:
+        engine = import_module(settings.SESSION_ENGINE)
+        request = HttpRequest()
+        request.session = engine.SessionStore(session_key)
+        user = auth.get_user(request)
+        return user.pk if user.is_authenticated and user.is_active else None
+    finally:
+        close_old_connections()
+
+
+def _unread_count(user_id):
+    try:
+        return unread_count(user_id)
+    finally:
+        close_old_connections()
+
+
+async def _disconnect(receive):
+    # the request body comes first (empty for a GET)
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _message(event):
+    return f'event: {event["event"]}\ndata: {json.dumps(event["data"])}\n\n'.encode()
+
+
+
+class LiveUpdatesMiddleware:
+    # ASGI middleware serving the live-events URL, everything else goes to the application
+
+    def __init__(self, application):
+        self.application = application
+        self.path = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            if self.path is None:
+                self.path = await sync_to_async(reverse)('live-events')
+            if scope['path'] == self.path:
+                return await self.events(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def events(self, scope, receive, send):
+        headers = dict(scope['headers'])
+        cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+        session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+        user_id = await sync_to_async(_session_user_id)(session_key) if session_key else None
+        if user_id is None:
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Forbidden'})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),      # no proxy buffering (nginx)
+        ]})
+        subscription = _subscribe(user_id, _Subscription(asyncio.get_event_loop()))
+        disconnected = asyncio.ensure_future(_disconnect(receive))
+        try:
+            # the current state first, so a reconnected page catches up with what it missed
+            unread = await sync_to_async(_unread_count)(user_id)
+            await send({'type': 'http.response.body', 'body': _message({'event': 'notifications', 'data': {'unread': unread}}), 'more_body': True})
+            while True:
+                next_event = asyncio.ensure_future(subscription.queue.get())
+                done, pending = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    next_event.cancel()
+                    break
+                if next_event in done:
+                    body = _message(next_event.result())
+                else:
+                    next_event.cancel()
+                    body = b': keepalive\n\n'
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            _unsubscribe(user_id, subscription)
+            disconnected.cancel()
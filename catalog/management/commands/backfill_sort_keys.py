@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored collation sort keys and work keys of every book (e.g. after the collation table has changed).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        books = []
+        updated = 0
+        for book in Book.objects.only('last_name_author', 'first_name_author', 'title', 'sort_key', 'work_key').iterator(chunk_size=batch_size):
+            old_keys = (book.sort_key, book.work_key)
+            book.refresh_keys()
+            if (book.sort_key, book.work_key) != old_keys:
+                books.append(book)
+            if len(books) == batch_size:
+                Book.objects.bulk_update(books, ['sort_key', 'work_key'])
+                updated += len(books)
+                books = []
+        Book.objects.bulk_update(books, ['sort_key', 'work_key'])
+        updated += len(books)
+        self.stdout.write(self.style.SUCCESS(f'{updated} book(s) updated.'))
@@ -0,0 +1,38 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Measures latency, query count and peak memory of every catalog page and writes the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='The user making the requests (default: the one with the most friends).')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--url', action='append', dest='names', help='Only this URL name (can be repeated).')
+        parser.add_argument('--clear-cache', action='store_true', help='Clear the cache before every request (no cached feed pages).')
+        parser.add_argument('--output', help='Output file (default: standard output).')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'No such user: {options["user"]}')
+        else:
+            user = benchmark.default_user()
+            if user is None:
+                raise CommandError('There are no users (see the seed_catalog command).')
+
+        results = benchmark.run(user, repeat=options['repeat'], names=options['names'], clear_cache=options['clear_cache'])
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+            output.write('\n')
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+import pyuca
+from pyuca import Collator
+
+
+# code point ranges kept in the table: Latin letters with all their accents, the
+# combining diacritics, digits and the common punctuation
+LATIN_RANGES = (
+    (0x0000, 0x024F),       # Basic Latin, Latin-1 Supplement, Latin Extended-A and -B
+    (0x0300, 0x036F),       # Combining Diacritical Marks
+    (0x1E00, 0x1EFF),       # Latin Extended Additional
+    (0x2000, 0x206F),       # General Punctuation
+)
+
+
+def in_ranges(code_points):
+    return all(any(start <= code_point <= end for start, end in LATIN_RANGES) for code_point in code_points)
+
+
+class Command(BaseCommand):
+    help = 'Writes a collation table trimmed to the Latin scripts, for the CATALOG_COLLATION_TABLE setting.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='The table file to write.')
+
+    def handle(self, *args, **options):
+        source = os.path.join(os.path.dirname(pyuca.__file__), f'allkeys-{Collator.UCA_VERSION}.txt')
+        kept = 0
+        with open(source, encoding='utf-8') as keys_file, open(options['output'], 'w', encoding='utf-8') as output:
+            for line in keys_file:
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                if not line.startswith('@'):
+                    code_points = [int(code_point, 16) for code_point in line.split(';', 1)[0].split()]
+                    if not in_ranges(code_points):
+                        continue
+                    kept += 1
+                output.write(line + '\n')
+        self.stdout.write(self.style.SUCCESS(f'{kept} collation elements of {source} written to {options["output"]}.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from catalog import notifications
+
+
+class Command(BaseCommand):
+    help = 'Deletes the confirmed friend requests and the dismissed rejections, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Keep the records of the last days.')
+        parser.add_argument('--batch-size', type=int, default=notifications.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        requests, rejections = notifications.compact(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{requests} confirmed requests and {rejections} dismissed rejections deleted.'))
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from catalog import friends
+from catalog.feeds import FriendFeed
+from catalog.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Prints the query plans of the hot book list queries (for checking that the Book indexes are used).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', nargs='?', help='The user whose lists are explained (default: the one with the most books).')
+
+    def handle(self, *args, **options):
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f'No such user: {options["username"]}')
+        else:
+            user = User.objects.annotate(book_count=Count('my_book')).order_by('-book_count').first()
+            if user is None:
+                raise CommandError('There are no users.')
+
+        friend_ids = friends.friend_ids(user)
+        queries = [
+            ('mybooks', Book.objects.filter(owner=user, owner_nonuser__isnull=True)),
+            ('mybooks-recom', Book.objects.filter(owner=user, recommended=True)),
+            ('mybooks-wished', Book.objects.filter(owner=user, wished=True)),
+            ('mybooks-loaned', Book.objects.filter(owner=user, loaned=True)),
+            ('borrowed-books', Book.objects.filter(borrower=user)),
+            ('borrowed-books-fromnonusers', Book.objects.filter(owner=user, owner_nonuser__isnull=False)),
+            ('friend-recom-books', Book.objects.filter(owner=next(iter(friend_ids), None), recommended=True)),
+            ('recom-books-byauthor', FriendFeed('recommended').books(user)),
+            ('wished-books-byowner', FriendFeed('wished', group_by='owner').books(user)),
+        ]
+        self.stdout.write(f'User: {user.username} ({len(friend_ids)} friends)')
+        for name, books in queries:
+            if not books.query.order_by:
+                books = books.order_by('sort_key', 'book_id')
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+            self.stdout.write(books.explain())
@@ -0,0 +1,29 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import exporter
+
+
+class Command(BaseCommand):
+    help = 'Exports the books of a user as CSV, JSON or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=sorted(exporter.FORMATS), default='csv')
+        parser.add_argument('--output', help='Output file (default: standard output).')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No such user: {options["username"]}')
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in exporter.export_books(user, options['format']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
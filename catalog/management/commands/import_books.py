@@ -0,0 +1,33 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import importer
+
+
+class Command(BaseCommand):
+    help = 'Imports books of a user from a CSV (with header row), JSON or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json', 'ndjson'], help='Defaults to the extension of the file.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'No such user: {options["username"]}')
+
+        file_format = options['format'] or importer.format_from_name(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = importer.import_books(user, stream, file_format, batch_size=options['batch_size'])
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(f'The file could not be imported: {error}')
+
+        for number, message in result.errors:
+            self.stderr.write(f'row {number}: {message}')
+        self.stdout.write(self.style.SUCCESS(f'{result.created} book(s) imported, {result.failed} row(s) skipped.'))
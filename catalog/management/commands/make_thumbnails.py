@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Makes the missing or outdated resized copies of the profile pictures.'
+
+    def handle(self, *args, **options):
+        names = set(Profile.objects.values_list('image', flat=True))
+        for name in names:
+            Profile.make_thumbnails(name)
+        self.stdout.write(self.style.SUCCESS(f'Thumbnails checked for {len(names)} images.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from catalog import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text book search index from the Book table.'
+
+    def handle(self, *args, **options):
+        index = search.get_index()
+        index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({type(index).__name__}).'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from catalog import seeding
+
+
+class Command(BaseCommand):
+    help = 'Seeds a synthetic dataset (users, power-law friendship graph, libraries) for load tests and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--books-per-user', type=int, default=50, help='Average library size.')
+        parser.add_argument('--friends-per-user', type=int, default=3, help='Friends made by every new user of the graph.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same dataset.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of the generated users.')
+
+    def handle(self, *args, **options):
+        users, friendships, books = seeding.seed(
+            users=options['users'],
+            books_per_user=options['books_per_user'],
+            friends_per_user=options['friends_per_user'],
+            random_seed=options['seed'],
+            prefix=options['prefix'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{users} users, {friendships} friendships and {books} books created (password: {seeding.PASSWORD}).'))
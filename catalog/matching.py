@@ -0,0 +1,36 @@
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+
+from catalog import collation, friends
+from catalog.models import Book
+
+
+# The books on a user's wishlist that a friend recommends and hasn't lent to anyone,
+# matched on Book.work_key. The lendable copies are found through the partial
+# (work_key, owner) index of the recommended books, which follows every book edit,
+# as the key is refreshed on each save.
+
+def lendable_copies(friend_ids):
+    return Book.objects.filter(recommended=True, loaned=False, owner__in=friend_ids)
+
+
+def wished_matches(user):
+    friend_ids = friends.friend_ids(user)
+    copies = lendable_copies(friend_ids).filter(work_key=OuterRef('work_key'))
+    return (Book.objects.filter(owner=user, wished=True).annotate(has_copy=Exists(copies)).filter(has_copy=True)
+            .order_by('sort_key', 'book_id'))
+
+
+def attach_lenders(books, user):
+    # book.lenders: the friends (with their profiles) who have a copy, for one page of books
+    books = list(books)
+    copies = (lendable_copies(friends.friend_ids(user)).filter(work_key__in={book.work_key for book in books})
+              .select_related('owner', 'owner__profile'))
+    owners = defaultdict(list)
+    for copy in copies:
+        if copy.owner not in owners[copy.work_key]:
+            owners[copy.work_key].append(copy.owner)
+    for book in books:
+        book.lenders = collation.sort_objects(owners[book.work_key], lambda friend: friend.username)
+    return books
@@ -0,0 +1,87 @@
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from catalog import profiling, tasks
+from catalog.models import TimingBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+# Opt-in request profiling: add 'catalog.middleware.ProfilingMiddleware' to MIDDLEWARE.
+# A CATALOG_PROFILING_SAMPLE_RATE share of the requests (default 0.1) is measured:
+# query count and SQL time, Python time, collation and template render time. The
+# results go to the Server-Timing header (visible in the browser's dev tools), the
+# slowest queries to the log, and the timings into per-URL-name histograms, which are
+# buffered in memory and written to TimingBucket (see the admin) every
+# CATALOG_PROFILING_FLUSH_INTERVAL seconds, in the background.
+
+_buffer = Counter()
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def record(url_name, profile):
+    global _last_flush
+    with _buffer_lock:
+        for metric, seconds in profile.timings.items():
+            _buffer[url_name, metric, TimingBucket.bucket_of(seconds * 1000)] += 1
+        due = time.monotonic() - _last_flush >= getattr(settings, 'CATALOG_PROFILING_FLUSH_INTERVAL', 60)
+        if due:
+            _last_flush = time.monotonic()
+    if due:
+        tasks.submit(flush)
+
+
+def flush():
+    global _buffer
+    with _buffer_lock:
+        buffer, _buffer = _buffer, Counter()
+    for (url_name, metric, bucket), count in buffer.items():
+        lookup = {'url_name': url_name, 'metric': metric, 'bucket': bucket}
+        if TimingBucket.objects.filter(**lookup).update(count=F('count') + count):
+            continue
+        try:
+            with transaction.atomic():
+                TimingBucket.objects.create(count=count, **lookup)
+        except IntegrityError:      # created by another process in the meantime
+            TimingBucket.objects.filter(**lookup).update(count=F('count') + count)
+
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'CATALOG_PROFILING_SAMPLE_RATE', 0.1)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        profiling.install_template_timing()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = profiling.start()
+        try:
+            with connection.execute_wrapper(profile):
+                response = self.get_response(request)
+        finally:
+            profiling.stop()
+        profile.finish()
+
+        response['Server-Timing'] = profile.server_timing()
+        url_name = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        if profile.slowest_queries:
+            logger.info('%s: %d queries, %.1f ms SQL; slowest: %s', url_name, profile.query_count, profile.timings['db'] * 1000,
+                        ' | '.join(f'{seconds * 1000:.1f} ms {sql}' for seconds, sql in sorted(profile.slowest_queries, reverse=True)))
+        record(url_name, profile)
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+def fill_sort_keys(apps, schema_editor):
+    from catalog.collation import sort_key
+
+    Book = apps.get_model('catalog', 'Book')
+    books = []
+    for book in Book.objects.only('last_name_author', 'first_name_author', 'title').iterator():
+        book.sort_key = sort_key(book.last_name_author, book.first_name_author, book.title)
+        books.append(book)
+        if len(books) == 500:
+            Book.objects.bulk_update(books, ['sort_key'])
+            books = []
+    Book.objects.bulk_update(books, ['sort_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0001_squashed_0034_auto_20200528_1310'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='book',
+            options={'ordering': ['sort_key', 'book_id']},
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='sort_key',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_sort_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'sort_key'], name='book_owner_sort_key_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_friend_edges(apps, schema_editor):
+    Friendship = apps.get_model('catalog', 'Friendship')
+    FriendEdge = apps.get_model('catalog', 'FriendEdge')
+    edges = []
+    for friendship in Friendship.objects.order_by('confirmation_datetime').iterator():
+        edges.append(FriendEdge(friendship_id=friendship.pk, user_id=friendship.confirmed_user_id, friend_id=friendship.requested_user_id))
+        edges.append(FriendEdge(friendship_id=friendship.pk, user_id=friendship.requested_user_id, friend_id=friendship.confirmed_user_id))
+    # duplicated friendships keep the edges of the oldest row
+    FriendEdge.objects.bulk_create(edges, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0002_book_sort_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FriendEdge',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('friend', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('friendship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='catalog.Friendship')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='friend_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='friendedge',
+            constraint=models.UniqueConstraint(fields=('user', 'friend'), name='unique_friend_edge'),
+        ),
+        migrations.RunPython(fill_friend_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:24
+
+from django.db import migrations, OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    # only SQLite builds with FTS5 get the table, other databases use the
+    # in-process inverted index of catalog/search.py
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from catalog.search import FTS_TABLE, book_text
+
+    try:
+        schema_editor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(book_id UNINDEXED, body, tokenize='unicode61 remove_diacritics 2')")
+    except OperationalError:
+        return
+
+    Book = apps.get_model('catalog', 'Book')
+    rows = [(book.pk.hex, book_text(book)) for book in Book.objects.only('last_name_author', 'first_name_author', 'title').iterator()]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (book_id, body) VALUES (%s, %s)', rows)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from catalog.search import FTS_TABLE
+
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_friendedge'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
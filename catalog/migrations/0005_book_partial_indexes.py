@@ -0,0 +1,33 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_book_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(recommended=True), fields=['owner', 'sort_key', 'book_id'], name='book_recommended_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(wished=True), fields=['owner', 'sort_key', 'book_id'], name='book_wished_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(loaned=True), fields=['owner', 'sort_key', 'book_id'], name='book_loaned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(owner_nonuser__isnull=False), fields=['owner', 'sort_key', 'book_id'], name='book_nonuser_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['borrower', 'sort_key', 'book_id'], name='book_borrower_sort_key_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_book_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimingBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_name', models.CharField(max_length=200)),
+                ('metric', models.CharField(max_length=20)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['url_name', 'metric', 'bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timingbucket',
+            constraint=models.UniqueConstraint(fields=('url_name', 'metric', 'bucket'), name='unique_timing_bucket'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.3 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+def fill_work_keys(apps, schema_editor):
+    from catalog.collation import work_key
+
+    Book = apps.get_model('catalog', 'Book')
+    books = []
+    for book in Book.objects.only('last_name_author', 'first_name_author', 'title').iterator():
+        book.work_key = work_key(book.last_name_author, book.first_name_author, book.title)
+        books.append(book)
+        if len(books) == 500:
+            Book.objects.bulk_update(books, ['work_key'])
+            books = []
+    Book.objects.bulk_update(books, ['work_key'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_timingbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='work_key',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_work_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(recommended=True), fields=['work_key', 'owner'], name='book_recommended_work_idx'),
+        ),
+    ]
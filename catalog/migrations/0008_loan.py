@@ -0,0 +1,58 @@
+# Generated by Django 3.0.3 on 2026-10-18 12:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_current_loans(apps, schema_editor):
+    # the books loaned at the time of the migration get an open loan; there is no earlier history
+    import datetime
+
+    Book = apps.get_model('catalog', 'Book')
+    Loan = apps.get_model('catalog', 'Loan')
+    loans = []
+    for book in Book.objects.filter(loaned=True, owner__isnull=False).only('owner', 'borrower', 'borrower_nonuser', 'loan_date').iterator():
+        loans.append(Loan(book_id=book.pk, owner_id=book.owner_id, borrower_id=book.borrower_id, borrower_nonuser=book.borrower_nonuser, loan_date=book.loan_date or datetime.date.today()))
+        if len(loans) == 500:
+            Loan.objects.bulk_create(loans)
+            loans = []
+    Loan.objects.bulk_create(loans)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0007_book_work_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Loan',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borrower_nonuser', models.CharField(blank=True, max_length=200, null=True)),
+                ('loan_date', models.DateField()),
+                ('returned_at', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='catalog.Book')),
+                ('borrower', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='loans_taken', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='loans_given', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-loan_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(returned_at__isnull=True), fields=['owner', 'loan_date'], name='loan_open_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(returned_at__isnull=True), fields=['borrower', 'loan_date'], name='loan_open_borrower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['owner', 'loan_date'], name='loan_owner_idx'),
+        ),
+        migrations.RunPython(open_current_loans, migrations.RunPython.noop),
+    ]
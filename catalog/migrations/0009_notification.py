@@ -0,0 +1,58 @@
+# Generated by Django 3.0.3 on 2026-10-18 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_notifications(apps, schema_editor):
+    # the pending requests and undismissed rejections become notifications, and the counters follow them
+    from django.db.models import Count
+
+    FriendRequest = apps.get_model('catalog', 'FriendRequest')
+    RejectedFriendship = apps.get_model('catalog', 'RejectedFriendship')
+    Notification = apps.get_model('catalog', 'Notification')
+    Profile = apps.get_model('catalog', 'Profile')
+    Notification.objects.bulk_create(
+        [Notification(recipient_id=fr.requested_friend_id, actor_id=fr.user_id, kind='request', created=fr.request_datetime)
+         for fr in FriendRequest.objects.filter(confirmed_request=False).iterator()]
+        + [Notification(recipient_id=rej.rejected_id, actor_id=rej.rejecter_id, kind='rejected', created=rej.rejection_datetime)
+           for rej in RejectedFriendship.objects.filter(notif_deleted=False).iterator()],
+        batch_size=500,
+    )
+    for recipient_id, count in Notification.objects.values_list('recipient').annotate(count=Count('id')).order_by():
+        Profile.objects.filter(user_id=recipient_id).update(unread_notifications=count)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0008_loan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('request', 'Barátnak jelölés'), ('rejected', 'Visszautasított jelölés')], max_length=10)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'kind', 'actor'], name='notification_recipient_idx'),
+        ),
+        migrations.RunPython(create_notifications, migrations.RunPython.noop),
+    ]
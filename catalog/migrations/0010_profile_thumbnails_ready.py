@@ -0,0 +1,30 @@
+# Generated by Django 3.0.3 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+def mark_ready_thumbnails(apps, schema_editor):
+    # the pictures whose resized copies are already there (the rest get them from make_thumbnails)
+    from django.core.files.storage import default_storage
+    from catalog.images import SIZES, thumbnail_name
+
+    Profile = apps.get_model('catalog', 'Profile')
+    names = set(Profile.objects.values_list('image', flat=True))
+    ready = [name for name in names if all(default_storage.exists(thumbnail_name(name, size)) for size in SIZES.values())]
+    Profile.objects.filter(image__in=ready).update(thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_ready_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0010_profile_thumbnails_ready'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='my_book', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
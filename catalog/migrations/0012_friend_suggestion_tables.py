@@ -0,0 +1,60 @@
+# Generated by Django 3.0.3 on 2026-10-18 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_suggestion_tables(apps, schema_editor):
+    # the mutual friend counts from the friend edges, and the name keys of every user
+    from catalog.collation import fold
+    from catalog.suggestions import NAME_FIELDS, REBUILD_SQL
+
+    schema_editor.execute(REBUILD_SQL)
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserNameKey = apps.get_model('catalog', 'UserNameKey')
+    keys = []
+    for user in User.objects.only(*NAME_FIELDS).iterator():
+        keys.extend(UserNameKey(user_id=user.pk, key=key[:150]) for key in {fold(getattr(user, name)).strip() for name in NAME_FIELDS} if key)
+    UserNameKey.objects.bulk_create(keys, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0011_book_owner_no_fk_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserNameKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MutualFriendCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mutual', models.PositiveIntegerField(default=0)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usernamekey',
+            index=models.Index(fields=['key', 'user'], name='user_name_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfriendcount',
+            index=models.Index(fields=['user', '-mutual', 'candidate'], name='mutual_friend_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mutualfriendcount',
+            constraint=models.UniqueConstraint(fields=('user', 'candidate'), name='unique_mutual_friend_count'),
+        ),
+        migrations.RunPython(fill_suggestion_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.3 on 2026-10-18 17:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('catalog', '0012_friend_suggestion_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_owner_sort_key_idx',
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='borrower',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrowed_book', to=settings.AUTH_USER_MODEL, verbose_name='Neki (felhasználó)'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_owner_sort_key_idx'),
+        ),
+    ]
@@ -1,11 +1,13 @@
-from django.db import models
+import bisect
+from django.db import models, transaction
 from django.urls import reverse            
 import uuid                                 
 from django.contrib.auth.models import User
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from django.conf import settings
 from django.utils import timezone
 
-from PIL import Image
+from . import collation, images, tasks
 
 
 class Genre(models.Model):
@@ -29,9 +31,21 @@ class Language(models.Model):
 
 
 
+class BookQuerySet(models.QuerySet):
+    # fetch plans of the book lists: everything the list templates render is joined in
+    # the same query, so the number of queries doesn't depend on the number of books
+
+    def for_listing(self):
+        return self.select_related('owner', 'owner__profile', 'genre', 'language')
+
+    def with_borrower(self):
+        return self.select_related('borrower', 'borrower__profile')
+
+
+
 class Book(models.Model):
     book_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    owner = models.ForeignKey(User, related_name='my_book', on_delete=models.CASCADE, null=True, blank=True)
+    owner = models.ForeignKey(User, related_name='my_book', on_delete=models.CASCADE, null=True, blank=True, db_index=False)   # (owner, sort_key, book_id) index below
     owner_nonuser = models.CharField(max_length=200, verbose_name='Nem-felhasználó', help_text="Valaki, aki nem regisztrált felhasználó az oldalon vagy még nem a barátod.", null=True, blank=True)
     last_name_author = models.CharField(verbose_name='Szerző vezetékneve', max_length=100)
     first_name_author = models.CharField(verbose_name='Szerző keresztneve', max_length=100)
@@ -41,18 +55,83 @@ class Book(models.Model):
     recommended = models.BooleanField(verbose_name='Ajánlom másoknak', default=False, help_text='Van ilyen könyved, és szívesen kölcsönadnád barátaidnak.')
     wished = models.BooleanField(verbose_name='Kívánságlistámra teszem', default=False, help_text='Neked nincs meg, de szívesen elolvasnád.')
     loaned = models.BooleanField(verbose_name='Kölcsönadtam', default=False, help_text='Csak ajánlott könyvet tudsz kölcsönadni. (Miután visszakaptad, csak "pipáld vissza" és mentsd el, az adatok törlődni fognak.)')
-    borrower = models.ForeignKey(User, related_name='borrowed_book', verbose_name='Neki (felhasználó)', on_delete=models.SET_NULL, null=True, blank=True)
+    borrower = models.ForeignKey(User, related_name='borrowed_book', verbose_name='Neki (felhasználó)', on_delete=models.SET_NULL, null=True, blank=True, db_index=False)   # (borrower, sort_key, book_id) index below
     borrower_nonuser = models.CharField(max_length=200, verbose_name='Neki (nem-felhasználó)', help_text="Valaki, aki nem regisztrált felhasználó az oldalon vagy még nem a barátod.", null=True, blank=True)
     loan_date = models.DateField(verbose_name='Ezen a napon', blank=True, null=True)
     comment = models.TextField(max_length=300, verbose_name='Komment', blank=True, help_text='Ajánlott/kölcsönadott és kívánságlistádon szereplő könyveid esetében a barátaid ezt látják.')
+    sort_key = models.TextField(default='', editable=False)   # Hungarian collation key of (last_name_author, first_name_author, title)
+    work_key = models.TextField(default='', editable=False)   # folded 'last name|first name|title', the same for every copy of a work
+
+    objects = BookQuerySet.as_manager()
 
     class Meta:
-        ordering = ['last_name_author', 'first_name_author', 'title']
+        ordering = ['sort_key', 'book_id']
+        indexes = [
+            models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_owner_sort_key_idx'),
+            # partial indexes of the book lists (and feeds): only the flagged books are indexed,
+            # in the order of the lists, so a page is read from the index without sorting
+            models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_recommended_idx', condition=models.Q(recommended=True)),
+            models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_wished_idx', condition=models.Q(wished=True)),
+            models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_loaned_idx', condition=models.Q(loaned=True)),
+            models.Index(fields=['owner', 'sort_key', 'book_id'], name='book_nonuser_idx', condition=models.Q(owner_nonuser__isnull=False)),
+            models.Index(fields=['borrower', 'sort_key', 'book_id'], name='book_borrower_sort_key_idx'),
+            # the lendable copies of a work (see matching.py)
+            models.Index(fields=['work_key', 'owner'], name='book_recommended_work_idx', condition=models.Q(recommended=True)),
+        ]
 
 
     def __str__(self):
         return f'{self.last_name_author}, {self.first_name_author}: {self.title}'
 
+    def refresh_keys(self):      # bulk_create() skips save(), so callers of it have to call this themselves
+        self.sort_key = collation.sort_key(self.last_name_author, self.first_name_author, self.title)
+        self.work_key = collation.work_key(self.last_name_author, self.first_name_author, self.title)
+
+    # The loan fields as they are in the database, so that save() can tell a lending and
+    # a return from the other edits and keep the Loan ledger up to date. None: not loaned
+    # (or not saved yet); LOAN_UNKNOWN: loaded without the loan fields, not tracked.
+
+    LOAN_FIELDS = ('loaned', 'borrower_id', 'borrower_nonuser', 'loan_date')
+    LOAN_UNKNOWN = object()
+
+    _saved_loan = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in field_names for name in cls.LOAN_FIELDS):
+            instance._saved_loan = instance.loan_state()
+        else:
+            instance._saved_loan = cls.LOAN_UNKNOWN
+        return instance
+
+    def loan_state(self):
+        return (self.borrower_id, self.borrower_nonuser, self.loan_date) if self.loaned else None
+
+    def new_loan(self):      # for bulk_create() as well, which skips save()
+        return Loan(book=self, owner_id=self.owner_id, borrower_id=self.borrower_id, borrower_nonuser=self.borrower_nonuser, loan_date=self.loan_date or date.today())
+
+    def _record_loan(self):
+        if self._saved_loan is self.LOAN_UNKNOWN:
+            return
+        state = self.loan_state()
+        if state == self._saved_loan:
+            return
+        open_loan = Loan.objects.filter(book=self).open()
+        if state is None:
+            open_loan.update(returned_at=timezone.now())
+        elif self._saved_loan is None:
+            self.new_loan().save()
+        else:       # the same loan, with corrected details
+            open_loan.update(borrower_id=self.borrower_id, borrower_nonuser=self.borrower_nonuser, loan_date=self.loan_date or date.today())
+        self._saved_loan = state
+
+    def save(self, *args, **kwargs):
+        self.refresh_keys()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._record_loan()
+
   
     def get_absolute_url(self):
         return reverse('book-detail', args=[str(self.book_id)])
@@ -60,6 +139,54 @@ class Book(models.Model):
 
 
 
+class LoanQuerySet(models.QuerySet):
+
+    def open(self):
+        return self.filter(returned_at__isnull=True)
+
+    # open loans older than CATALOG_LOAN_OVERDUE_DAYS (default 60) days
+    def overdue(self, days=None):
+        if days is None:
+            days = Loan.overdue_days()
+        return self.open().filter(loan_date__lt=date.today() - timedelta(days=days))
+
+
+
+class Loan(models.Model):
+    # One lending of a book, from the day it was marked as loaned until it was returned
+    # (the loaned mark removed). The Book loan fields show the current state only, the
+    # loans are the history. Written by Book.save() (and next to bulk_create()).
+    book = models.ForeignKey(Book, related_name='loans', on_delete=models.CASCADE)
+    owner = models.ForeignKey(User, related_name='loans_given', on_delete=models.CASCADE, db_index=False)
+    borrower = models.ForeignKey(User, related_name='loans_taken', on_delete=models.SET_NULL, null=True, blank=True)
+    borrower_nonuser = models.CharField(max_length=200, null=True, blank=True)
+    loan_date = models.DateField()
+    returned_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LoanQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-loan_date']
+        indexes = [
+            models.Index(fields=['owner', 'loan_date'], name='loan_open_owner_idx', condition=models.Q(returned_at__isnull=True)),
+            models.Index(fields=['borrower', 'loan_date'], name='loan_open_borrower_idx', condition=models.Q(returned_at__isnull=True)),
+            models.Index(fields=['owner', 'loan_date'], name='loan_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.book} -> {self.borrower or self.borrower_nonuser} ({self.loan_date})'
+
+    @staticmethod
+    def overdue_days():
+        return getattr(settings, 'CATALOG_LOAN_OVERDUE_DAYS', 60)
+
+    @property
+    def days(self):
+        end = self.returned_at.date() if self.returned_at else date.today()
+        return (end - self.loan_date).days
+
+
+
 class FriendRequest(models.Model):
     user = models.ForeignKey(User, related_name='request_user', on_delete=models.CASCADE)
     requested_friend = models.ForeignKey(User, related_name='requested_friend', on_delete=models.CASCADE)
@@ -86,6 +213,36 @@ class RejectedFriendship(models.Model):
 
 
 
+# The unhandled notifications of a user: a friend request waiting for an answer, or a
+# rejection of the user's own request not dismissed yet. They are kept in step with
+# FriendRequest and RejectedFriendship by the signals (see notifications.py) and go
+# away once handled, so the notification page and the counters read only the unread
+# ones, not the whole history.
+
+class Notification(models.Model):
+    FRIEND_REQUEST = 'request'
+    REJECTED_REQUEST = 'rejected'
+    KIND_CHOICES = [
+        (FRIEND_REQUEST, 'Barátnak jelölés'),
+        (REJECTED_REQUEST, 'Visszautasított jelölés'),
+    ]
+
+    recipient = models.ForeignKey(User, related_name='notifications', on_delete=models.CASCADE)
+    actor = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['recipient', 'kind', 'actor'], name='notification_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipient}: {self.get_kind_display()} ({self.actor})'
+
+
+
 class Friendship(models.Model):
     confirmed_user = models.ForeignKey(User, related_name='confirmed_user', on_delete=models.CASCADE) 
     requested_user = models.ForeignKey(User, related_name='requested_user', on_delete=models.CASCADE)
@@ -94,21 +251,167 @@ class Friendship(models.Model):
     def __str__(self):  
         return f'{self.confirmed_user} - {self.requested_user} friendship'
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            if created:
+                FriendEdge.objects.bulk_create([
+                    FriendEdge(friendship=self, user_id=self.confirmed_user_id, friend_id=self.requested_user_id),
+                    FriendEdge(friendship=self, user_id=self.requested_user_id, friend_id=self.confirmed_user_id),
+                ])
+
+
+
+class FriendEdge(models.Model):
+    # every friendship is stored in both directions, so the friends of a user can be read
+    # with one range scan on the (user, friend) index, and a second friendship between
+    # the same two users is rejected by the database
+    friendship = models.ForeignKey(Friendship, related_name='edges', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='friend_edges', on_delete=models.CASCADE, db_index=False)
+    friend = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'friend'], name='unique_friend_edge'),
+        ]
+
+    def __str__(self):  
+        return f'{self.user} -> {self.friend}'
+
+
+
+class MutualFriendCount(models.Model):
+    # the number of mutual friends of two users (in both directions, for every pair with
+    # at least one), kept up to date by the Friendship signals (see suggestions.py), so
+    # the best friend suggestions are the first rows of the user on the rank index
+    user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE, db_index=False)
+    candidate = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    mutual = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='unique_mutual_friend_count'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual', 'candidate'], name='mutual_friend_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.candidate}: {self.mutual}'
+
+
+
+class UserNameKey(models.Model):
+    # the folded username, last name and first name of every user (see suggestions.py):
+    # the friend request autocomplete reads the matching prefixes as a range of the index
+    user = models.ForeignKey(User, related_name='name_keys', on_delete=models.CASCADE)
+    key = models.CharField(max_length=150)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'user'], name='user_name_key_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.key}'
+
 
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(default='default.jpg', upload_to='profile_pics') # it should be deleted in case the user deletes himself
+    # the number of the user's notifications, maintained with F() updates (see notifications.py)
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+    # the resized copies of the current picture are made (see make_thumbnails()), the
+    # pages can link them without checking the storage
+    thumbnails_ready = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f'{self.user.username}\'s profile'
+
+    # the image as it is in the database (None for an unsaved profile), so that a save
+    # with an unchanged picture can be recognised and skipped
+
+    _saved_image = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'image' in field_names:
+            instance._saved_image = instance.image.name
+        return instance
+
+    @property
+    def image_changed(self):
+        return self._saved_image is None or self.image.name != self._saved_image
+
+    @property
+    def avatar_url(self):
+        return images.thumbnail_url(self.image.name, images.SIZES['avatar'], self.thumbnails_ready)
+
+    @property
+    def picture_url(self):
+        return images.thumbnail_url(self.image.name, images.SIZES['profile'], self.thumbnails_ready)
+
+    @classmethod
+    def make_thumbnails(cls, image_name):
+        images.make_thumbnails(image_name)
+        profiles = cls.objects.filter(image=image_name, thumbnails_ready=False)
+        user_ids = list(profiles.values_list('user_id', flat=True))
+        profiles.update(thumbnails_ready=True)
+        from catalog import feedcache       # it imports the models
+        feedcache.bump(*user_ids)
     
     def save(self, *args, **kwargs):
+        # the counter of an existing profile is only changed by the notifications, and the
+        # thumbnail flag by make_thumbnails(): an instance loaded earlier must not write
+        # their stale values back
+        old_image, image_changed = self._saved_image, self.image_changed
+        if image_changed:
+            self.thumbnails_ready = False
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kept = {'unread_notifications'} if image_changed else {'unread_notifications', 'thumbnails_ready'}
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in kept]
         super().save( *args, **kwargs)
-        img = Image.open(self.image.path)
-        if img.height > 300 or img.width > 300:
-            output_size = (300, 300)
-            img.thumbnail(output_size)
-            img.save(self.image.path)
+        self._saved_image = self.image.name
+        if not image_changed:
+            return
+        # the resized copies are made in the background, after the commit
+        image_name = self.image.name
+        transaction.on_commit(lambda: tasks.submit(Profile.make_thumbnails, image_name))
+        if old_image and old_image != self._meta.get_field('image').default:
+            transaction.on_commit(lambda: tasks.submit(images.delete_thumbnails, old_image))
+
+
 
 
+
+class TimingBucket(models.Model):
+    # one bucket of the per-view latency histograms of the profiling middleware
+    BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)     # the last bucket is everything above
+
+    url_name = models.CharField(max_length=200)
+    metric = models.CharField(max_length=20)      # total, db, python, collation, template
+    bucket = models.PositiveSmallIntegerField()   # index into BOUNDS_MS
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['url_name', 'metric', 'bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['url_name', 'metric', 'bucket'], name='unique_timing_bucket'),
+        ]
+
+    @classmethod
+    def bucket_of(cls, milliseconds):
+        return bisect.bisect_left(cls.BOUNDS_MS, milliseconds)
+
+    @property
+    def label(self):
+        if self.bucket < len(self.BOUNDS_MS):
+            return f'≤ {self.BOUNDS_MS[self.bucket]} ms'
+        return f'> {self.BOUNDS_MS[-1]} ms'
+
+    def __str__(self):
+        return f'{self.url_name} {self.metric} {self.label}: {self.count}'
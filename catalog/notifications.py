@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from catalog import live
+from catalog.models import FriendRequest, Notification, Profile, RejectedFriendship
+
+
+# The notifications follow the friend requests and the rejections (see signals.py):
+# a pending request and an undismissed rejection have one, which is deleted once the
+# request is answered, withdrawn or the rejection dismissed. The unread counter on the
+# profile changes with every notification created or deleted, in the same transaction
+# and with F() updates, so the navbar badge is a column read. Notifications are only
+# deleted through delete() below, which counts them first; the ones of a deleted actor
+# go before the cascade (see signals.py), whose FriendRequest/RejectedFriendship
+# deletions would otherwise clear them a second time.
+# The answered requests and dismissed rejections themselves are only history;
+# compact() purges them in batches (see the compact_notifications command).
+
+BATCH_SIZE = 1000
+
+
+def _add_unread(user_id, count):
+    # clamped at 0, so a counter that drifted below the real count still comes down
+    Profile.objects.filter(user_id=user_id).update(unread_notifications=Greatest(F('unread_notifications') + count, 0))
+
+
+def _publish(recipient_id, kind=None):
+    # the new counter to the recipient's open pages (see live.py)
+    if live.is_listening(recipient_id):
+        transaction.on_commit(lambda: live.publish(recipient_id, 'notifications', unread=live.unread_count(recipient_id), kind=kind))
+
+
+def notify(recipient_id, actor_id, kind):
+    with transaction.atomic():
+        Notification.objects.create(recipient_id=recipient_id, actor_id=actor_id, kind=kind)
+        _add_unread(recipient_id, 1)
+        _publish(recipient_id, kind)
+
+
+def delete(notifications):
+    with transaction.atomic():
+        for recipient_id, count in notifications.values_list('recipient_id').annotate(count=Count('id')).order_by():
+            _add_unread(recipient_id, -count)
+            _publish(recipient_id)
+        notifications.delete()
+
+
+def clear(recipient_id, actor_id, kind):
+    delete(Notification.objects.filter(recipient_id=recipient_id, actor_id=actor_id, kind=kind))
+
+
+def actor_deleted(user_id):
+    delete(Notification.objects.filter(actor_id=user_id))
+
+
+def unread(user):
+    # the user's notifications with the actors' profiles: {kind: [notification, ...]}
+    notifications = {kind: [] for kind, label in Notification.KIND_CHOICES}
+    for notification in Notification.objects.filter(recipient=user).select_related('actor__profile'):
+        notifications[notification.kind].append(notification)
+    return notifications
+
+
+def _purge(queryset, batch_size):
+    deleted = 0
+    while True:
+        batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=batch).delete()
+        deleted += len(batch)
+
+
+def compact(days=30, batch_size=BATCH_SIZE):
+    # (confirmed requests, dismissed rejections) deleted, the ones older than the given days
+    cutoff = timezone.now() - timedelta(days=days)
+    confirmed = FriendRequest.objects.filter(confirmed_request=True, request_datetime__lt=cutoff)
+    dismissed = RejectedFriendship.objects.filter(notif_deleted=True, rejection_datetime__lt=cutoff)
+    return _purge(confirmed, batch_size), _purge(dismissed, batch_size)
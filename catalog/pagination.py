@@ -0,0 +1,83 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+# Opt-in cursor (keyset) pagination for the book lists. With ?after=<key values,book_id>
+# the list continues right after the given row, using the ordering of the queryset
+# (e.g. owner_rank, sort_key, book_id) as the key. Every page is then one indexed
+# range query, without the COUNT and the growing OFFSET of the page number mode.
+# ?after= (empty) starts the list from the beginning in cursor mode.
+
+def _after_row(fields, values):
+    condition = Q()
+    for i, field in enumerate(fields):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        q = Q(**{f'{field.lstrip("-")}__{lookup}': values[i]})
+        for previous, value in zip(fields[:i], values):
+            q &= Q(**{previous.lstrip('-'): value})
+        condition |= q
+    return condition
+
+
+def _page(queryset, fields, values, page_size):
+    # (rows, key values of the last row if there is a next page, else None)
+    try:
+        if values is not None:
+            if len(values) != len(fields):
+                raise ValueError(values)
+            queryset = queryset.filter(_after_row(fields, values))
+        rows = list(queryset[:page_size + 1])
+    except (ValidationError, ValueError):
+        raise Http404('Érvénytelen lap.')
+
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, [getattr(rows[-1], field.lstrip('-')) for field in fields]
+
+
+def keyset_page(queryset, cursor, page_size):
+    # (rows, cursor of the next page or None); cursor is the value of ?after= ('' for the first page)
+    fields = list(queryset.query.order_by)
+    rows, values = _page(queryset, fields, cursor.split(',') if cursor else None, page_size)
+    return rows, values and ','.join(str(value) for value in values)
+
+
+def opaque_cursor_page(queryset, cursor, page_size):
+    # like keyset_page(), with the key values of the last row packed into an opaque
+    # (URL safe base64 JSON) cursor; the next page doesn't need that row any more, so
+    # it still works after the row was deleted or left the list
+    fields = list(queryset.query.order_by)
+    values = None
+    if cursor:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or not all(isinstance(value, (str, int, float)) for value in values):
+                raise ValueError(cursor)
+        except ValueError:      # also the base64, JSON and UTF-8 decoding errors
+            raise Http404('Érvénytelen lap.')
+    rows, values = _page(queryset, fields, values, page_size)
+    if values is None:
+        return rows, None
+    return rows, base64.urlsafe_b64encode(json.dumps(values, default=str, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+class KeysetPaginationMixin:
+    cursor_param = 'after'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_param not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        books, self.next_cursor = keyset_page(queryset, self.request.GET[self.cursor_param], page_size)
+        return (None, None, books, False)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_mode'] = self.cursor_param in self.request.GET
+        context['next_cursor'] = getattr(self, 'next_cursor', None)
+        return context
@@ -0,0 +1,93 @@
+import functools
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+
+# The measurements of one sampled request (see ProfilingMiddleware in middleware.py).
+# It lives in a thread local while the request runs, so code anywhere in the request
+# (the collation functions, the template backend) can add its own time to it; without
+# a profiled request the timers cost one attribute lookup.
+
+SLOWEST_QUERIES = 3
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = defaultdict(float)   # metric -> seconds
+        self.query_count = 0
+        self.slowest_queries = []           # heap of (seconds, sql)
+
+    # connection.execute_wrapper() hook
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.timings['db'] += duration
+            if len(self.slowest_queries) < SLOWEST_QUERIES:
+                heapq.heappush(self.slowest_queries, (duration, sql))
+            else:
+                heapq.heappushpop(self.slowest_queries, (duration, sql))
+
+    def finish(self):
+        self.timings['total'] = time.perf_counter() - self.started
+        # the time spent in Python (views, templates, collation), not waiting for the database
+        self.timings['python'] = self.timings['total'] - self.timings['db']
+
+    def server_timing(self):
+        descriptions = {'db': f'{self.query_count} queries'}
+        return ', '.join(
+            f'{metric};dur={seconds * 1000:.1f}' + (f';desc="{descriptions[metric]}"' if metric in descriptions else '')
+            for metric, seconds in self.timings.items()
+        )
+
+
+def start():
+    _local.profile = RequestProfile()
+    return _local.profile
+
+
+def stop():
+    _local.profile = None
+
+
+def timed(metric):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = current()
+            if profile is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.timings[metric] += time.perf_counter() - start
+        return wrapper
+    return decorator
+
+
+_template_timing_installed = False
+
+
+def install_template_timing():
+    # the Django template backend has no hook around rendering, so its render() is wrapped
+    # (the time includes the queries run from the templates, e.g. by lazy querysets)
+    global _template_timing_installed
+    if not _template_timing_installed:
+        from django.template.backends.django import Template
+        Template.render = timed('template')(Template.render)
+        _template_timing_installed = True
@@ -0,0 +1,162 @@
+import bisect
+import re
+import threading
+
+from django.db import connection
+from django.db.models import Q
+
+from catalog.collation import fold
+from catalog.models import Book
+from catalog import friends
+
+
+FTS_TABLE = 'catalog_book_fts'
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+# accents (and case) are folded away on both the indexed text and the query, so a
+# search for "Jokai" finds "Jókai" as well
+
+def tokens(text):
+    return TOKEN_PATTERN.findall(fold(text))
+
+
+def book_text(book):
+    return fold(f'{book.last_name_author} {book.first_name_author} {book.title}')
+
+
+
+class FtsIndex:
+    # SQLite FTS5 virtual table (created by migration 0004), matching prefixes of every query word
+
+    def add(self, book):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE book_id = %s', [book.pk.hex])
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (book_id, body) VALUES (%s, %s)', [book.pk.hex, book_text(book)])
+
+    def add_many(self, books):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (book_id, body) VALUES (%s, %s)', [(book.pk.hex, book_text(book)) for book in books])
+
+    def remove(self, book_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE book_id = %s', [book_id.hex])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        books = []
+        for book in Book.objects.only('last_name_author', 'first_name_author', 'title').iterator(chunk_size=2000):
+            books.append(book)
+            if len(books) == 2000:
+                self.add_many(books)
+                books = []
+        self.add_many(books)
+
+    def filter(self, queryset, words):
+        match = ' '.join(f'"{word}"*' for word in words)
+        return queryset.extra(where=[f'catalog_book.book_id IN (SELECT book_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'], params=[match])
+
+
+
+class InvertedIndex:
+    # Pure Python fallback for databases without FTS5: token -> set of book ids, plus a
+    # sorted token list for the prefix lookups. It is built on first use and kept up to
+    # date by the Book signals of this process only, so it suits single-process setups.
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.postings = None
+        self.book_tokens = {}
+        self.sorted_tokens = []
+
+    def _ensure_built(self):
+        if self.postings is None:
+            self.rebuild()
+
+    def _add(self, book_id, text, keep_sorted=True):
+        words = set(TOKEN_PATTERN.findall(text))
+        self.book_tokens[book_id] = words
+        for word in words:
+            if word not in self.postings:
+                self.postings[word] = set()
+                if keep_sorted:
+                    bisect.insort(self.sorted_tokens, word)
+            self.postings[word].add(book_id)
+
+    def _remove(self, book_id):
+        for word in self.book_tokens.pop(book_id, ()):
+            ids = self.postings[word]
+            ids.discard(book_id)
+            if not ids:
+                del self.postings[word]
+                del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, word)]
+
+    def add(self, book):
+        with self.lock:
+            if self.postings is not None:
+                self._remove(book.pk)
+                self._add(book.pk, book_text(book))
+
+    def add_many(self, books):
+        with self.lock:
+            if self.postings is not None:
+                for book in books:
+                    self._add(book.pk, book_text(book))
+
+    def remove(self, book_id):
+        with self.lock:
+            if self.postings is not None:
+                self._remove(book_id)
+
+    def rebuild(self):
+        with self.lock:
+            self.postings = {}
+            self.book_tokens = {}
+            self.sorted_tokens = []
+            for book in Book.objects.only('last_name_author', 'first_name_author', 'title').iterator(chunk_size=2000):
+                self._add(book.pk, book_text(book), keep_sorted=False)
+            self.sorted_tokens = sorted(self.postings)
+
+    def _prefix_matches(self, prefix):
+        ids = set()
+        position = bisect.bisect_left(self.sorted_tokens, prefix)
+        while position < len(self.sorted_tokens) and self.sorted_tokens[position].startswith(prefix):
+            ids |= self.postings[self.sorted_tokens[position]]
+            position += 1
+        return ids
+
+    def filter(self, queryset, words):
+        with self.lock:
+            self._ensure_built()
+            ids = None
+            for word in words:
+                matches = self._prefix_matches(word)
+                ids = matches if ids is None else ids & matches
+        return queryset.filter(pk__in=ids)
+
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _index = FtsIndex()
+        else:
+            _index = InvertedIndex()
+    return _index
+
+
+# own books and the recommended/wished books of friends, ordered like the book lists
+
+def search_books(user, query):
+    words = tokens(query)
+    if not words:
+        return Book.objects.none()
+    friend_books = Q(owner__in=friends.friend_ids(user)) & (Q(recommended=True) | Q(wished=True))
+    books = Book.objects.for_listing().filter(Q(owner=user) | friend_books)
+    return get_index().filter(books, words).order_by('sort_key', 'book_id')
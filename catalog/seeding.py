@@ -0,0 +1,147 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from catalog import search, suggestions
+from catalog.models import Book, FriendEdge, FriendRequest, Friendship, Genre, Language, Loan, Profile, UserNameKey
+
+
+# Synthetic data for load tests and benchmarks. The same arguments (and seed) always
+# give the same dataset: users named <prefix>000000..., a friendship graph grown by
+# preferential attachment (so a few users have very many friends, most have a few),
+# and libraries of Hungarian authors with a mix of recommended, wished, loaned and
+# borrowed-from-nonuser books. Everything is written with bulk_create, so the signals
+# don't run: the profiles, the friend edges, the loans, the suggestion tables and the
+# search index are filled here.
+
+LAST_NAMES = [
+    'Ady', 'Arany', 'Babits', 'Bánffy', 'Csáth', 'Csokonai', 'Déry', 'Esterházy', 'Fekete', 'Gárdonyi',
+    'Herczeg', 'Illyés', 'Jókai', 'József', 'Karinthy', 'Kassák', 'Kertész', 'Kosztolányi', 'Krúdy', 'Lázár',
+    'Madách', 'Márai', 'Mikszáth', 'Móra', 'Móricz', 'Nádas', 'Németh', 'Ottlik', 'Örkény', 'Petőfi',
+    'Radnóti', 'Rejtő', 'Szabó', 'Szerb', 'Tamási', 'Tóth', 'Vörösmarty', 'Weöres', 'Wass', 'Zrínyi',
+]
+
+FIRST_NAMES = [
+    'Ágnes', 'Antal', 'Áron', 'Attila', 'Dezső', 'Endre', 'Ernő', 'Éva', 'Ferenc', 'Géza',
+    'Gyula', 'Imre', 'István', 'János', 'Jenő', 'Kálmán', 'Katalin', 'László', 'Magda', 'Miklós',
+    'Mihály', 'Mór', 'Péter', 'Sándor', 'Sarolta', 'Szilárd', 'Tibor', 'Zsigmond', 'Zsuzsa', 'Örs',
+]
+
+TITLE_WORDS = [
+    'arany', 'ember', 'éjszaka', 'ősz', 'kert', 'tenger', 'város', 'csillag', 'álom', 'fák',
+    'szerelem', 'háború', 'egri', 'csillagok', 'pál', 'utcai', 'fiúk', 'édes', 'anna', 'rozsdatemető',
+    'sorstalanság', 'tóték', 'macskajáték', 'erdély', 'ünnep', 'hajnal', 'tükör', 'öröm', 'tél', 'nyár',
+]
+
+GENRES = ['Regény', 'Novella', 'Vers', 'Dráma', 'Krimi', 'Sci-fi', 'Fantasy', 'Ifjúsági', 'Történelem', 'Ismeretterjesztő']
+
+LANGUAGES = ['magyar', 'angol', 'német', 'francia', 'olasz', 'spanyol', 'orosz', 'lengyel', 'cseh', 'szlovák', 'észt', 'finn']
+
+NONUSERS = ['Kati néni', 'Pista bácsi', 'a könyvtár', 'Zsófi', 'Bence', 'a szomszéd']
+
+PASSWORD = 'seed'
+
+BATCH_SIZE = 2000
+
+
+def friendship_pairs(rng, user_count, friends_per_user):
+    # Barabási-Albert style: every new user befriends up to friends_per_user earlier
+    # users, picked with a probability growing with the number of friends they already have
+    pairs = []
+    targets = []        # every user once, plus once more for each of their friends
+    for user in range(user_count):
+        chosen = set()
+        while len(chosen) < min(friends_per_user, user):
+            chosen.add(rng.choice(targets))
+        for friend in chosen:
+            pairs.append((friend, user))
+            targets.extend((friend, user))
+        targets.append(user)
+    return pairs
+
+
+def random_book(rng, owner, friend_ids, genre_ids, language_ids):
+    book = Book(
+        owner=owner,
+        last_name_author=rng.choice(LAST_NAMES),
+        first_name_author=rng.choice(FIRST_NAMES),
+        title=' '.join(rng.sample(TITLE_WORDS, rng.randint(1, 4))).capitalize(),
+        genre_id=rng.choice(genre_ids),
+        language_id=rng.choice(language_ids),
+    )
+    dice = rng.random()
+    if dice < 0.03:
+        book.owner_nonuser = rng.choice(NONUSERS)
+    elif dice < 0.25:
+        book.wished = True
+    elif dice < 0.65:
+        book.recommended = True
+        if rng.random() < 0.2:
+            book.loaned = True
+            book.loan_date = datetime.date.today() - datetime.timedelta(days=rng.randint(0, 400))
+            if friend_ids and rng.random() < 0.7:
+                book.borrower_id = rng.choice(friend_ids)
+            else:
+                book.borrower_nonuser = rng.choice(NONUSERS)
+    book.refresh_keys()
+    return book
+
+
+def _lookup_ids(model, names):
+    if not model.objects.exists():
+        model.objects.bulk_create([model(name=name) for name in names])
+    return list(model.objects.values_list('id', flat=True))
+
+
+def _bulk_create(model, objects):
+    for start in range(0, len(objects), BATCH_SIZE):
+        model.objects.bulk_create(objects[start:start + BATCH_SIZE])
+
+
+def _create_books(books):
+    Book.objects.bulk_create(books)
+    Loan.objects.bulk_create([book.new_loan() for book in books if book.loaned])
+
+
+def seed(users=100, books_per_user=50, friends_per_user=3, random_seed=0, prefix='seed'):
+    rng = random.Random(random_seed)
+    with transaction.atomic():
+        genre_ids = _lookup_ids(Genre, GENRES)
+        language_ids = _lookup_ids(Language, LANGUAGES)
+
+        password = make_password(PASSWORD)
+        first_id = (User.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+        user_objects = [User(id=first_id + number, username=f'{prefix}{number:06d}', password=password) for number in range(users)]
+        _bulk_create(User, user_objects)
+        _bulk_create(Profile, [Profile(user=user) for user in user_objects])
+        _bulk_create(UserNameKey, [key for user in user_objects for key in suggestions.name_keys(user)])
+
+        friends = {user.id: [] for user in user_objects}
+        friendships = []
+        for old, new in friendship_pairs(rng, users, friends_per_user):
+            friendships.append(Friendship(confirmed_user=user_objects[old], requested_user=user_objects[new]))
+            friends[user_objects[old].id].append(user_objects[new].id)
+            friends[user_objects[new].id].append(user_objects[old].id)
+        _bulk_create(Friendship, friendships)
+        friendships = list(Friendship.objects.filter(requested_user__in=user_objects).values_list('id', 'confirmed_user_id', 'requested_user_id'))
+        _bulk_create(FriendEdge, [FriendEdge(friendship_id=pk, user_id=a, friend_id=b) for pk, a, b in friendships] + [FriendEdge(friendship_id=pk, user_id=b, friend_id=a) for pk, a, b in friendships])
+        _bulk_create(FriendRequest, [FriendRequest(user_id=b, requested_friend_id=a, confirmed_request=True) for pk, a, b in friendships])
+        suggestions.rebuild()
+
+        book_count = 0
+        books = []
+        for user in user_objects:
+            for _ in range(int(rng.expovariate(1 / books_per_user)) if books_per_user else 0):
+                books.append(random_book(rng, user, friends[user.id], genre_ids, language_ids))
+                if len(books) == BATCH_SIZE:
+                    _create_books(books)
+                    book_count += len(books)
+                    books = []
+        _create_books(books)
+        book_count += len(books)
+
+    search.get_index().rebuild()
+    return users, len(friendships), book_count
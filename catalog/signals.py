@@ -1,9 +1,11 @@
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from django.db import transaction
 
-from .models import Profile
+from .models import Profile, Friendship, Book, FriendRequest, RejectedFriendship, Notification, Loan
+from . import feedcache, friends, images, live, notifications, search, suggestions, tasks
 
 # when a user is created, a profile is created and saved automatically
 
@@ -13,6 +15,151 @@ def create_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
 
 
+# the profile is saved with the user only when it was loaded and its picture changed,
+# so a login (the last_login update) costs no profile query and no UPDATE
+
 @receiver(post_save, sender=User)
 def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    if User.profile.is_cached(instance) and instance.profile.image_changed:
+        instance.profile.save()
+
+
+# friends' feeds (and the API) show the names of the book owners, so a new name bumps
+# the feed version, and the autocomplete keys of the names are written again; the names
+# as they were loaded are kept like Profile._saved_image (None: loaded without them,
+# and such a user can't save a new name without loading it)
+
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _user_names(instance):
+    if any(name in instance.get_deferred_fields() for name in USER_NAME_FIELDS):
+        return None
+    return tuple(getattr(instance, name) for name in USER_NAME_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_user_names(sender, instance, **kwargs):
+    instance._saved_names = _user_names(instance)
+
+
+@receiver(post_save, sender=User)
+def user_names_changed(sender, instance, created, **kwargs):
+    names = _user_names(instance)
+    if created or (names is not None and names != instance._saved_names):
+        suggestions.index_names(instance)
+        if not created:
+            feedcache.bump(instance.pk)
+    instance._saved_names = names
+
+
+# the cached friend sets of both users have to be rebuilt when a friendship changes
+# (only after commit, when the friend edges of a new friendship are already written)
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friends(sender, instance, **kwargs):
+    transaction.on_commit(lambda: friends.invalidate(instance.confirmed_user_id, instance.requested_user_id))
+    transaction.on_commit(lambda: feedcache.bump(instance.confirmed_user_id, instance.requested_user_id))
+
+
+# the mutual friend counts of the suggestions (see suggestions.py) change in the same transaction
+
+@receiver(post_save, sender=Friendship)
+def count_mutual_friends(sender, instance, created, **kwargs):
+    if created:
+        suggestions.friendship_created(instance.confirmed_user_id, instance.requested_user_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def uncount_mutual_friends(sender, instance, **kwargs):
+    suggestions.friendship_deleted(instance.confirmed_user_id, instance.requested_user_id)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_deleted_user(sender, instance, **kwargs):
+    suggestions.user_deleted(instance.pk)
+
+
+# the search index and the cached feeds follow every change of the books
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    search.get_index().add(instance)
+    if instance.owner_id:
+        feedcache.bump(instance.owner_id)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    search.get_index().remove(instance.pk)
+    if instance.owner_id:
+        feedcache.bump(instance.owner_id)
+
+
+# friends' feeds show the profile picture of the book owners
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    if instance.image_changed:
+        feedcache.bump(instance.user_id)
+
+
+# the resized copies of a deleted profile's picture go with it (the original is
+# deleted by django-cleanup); the copies of the shared default picture stay
+
+@receiver(post_delete, sender=Profile)
+def delete_profile_thumbnails(sender, instance, **kwargs):
+    if instance.image and instance.image.name != Profile._meta.get_field('image').default:
+        transaction.on_commit(lambda: tasks.submit(images.delete_thumbnails, instance.image.name))
+
+
+# the notifications of the friend requests and rejections (see notifications.py); an
+# answered request and a dismissed rejection have none left to clear
+
+@receiver(post_save, sender=FriendRequest)
+def friend_request_saved(sender, instance, created, **kwargs):
+    if created and not instance.confirmed_request:
+        notifications.notify(instance.requested_friend_id, instance.user_id, Notification.FRIEND_REQUEST)
+    elif instance.confirmed_request:
+        notifications.clear(instance.requested_friend_id, instance.user_id, Notification.FRIEND_REQUEST)
+
+
+@receiver(post_delete, sender=FriendRequest)
+def friend_request_deleted(sender, instance, **kwargs):
+    if not instance.confirmed_request:
+        notifications.clear(instance.requested_friend_id, instance.user_id, Notification.FRIEND_REQUEST)
+
+
+@receiver(post_save, sender=RejectedFriendship)
+def rejection_saved(sender, instance, created, **kwargs):
+    if created and not instance.notif_deleted:
+        notifications.notify(instance.rejected_id, instance.rejecter_id, Notification.REJECTED_REQUEST)
+    elif instance.notif_deleted:
+        notifications.clear(instance.rejected_id, instance.rejecter_id, Notification.REJECTED_REQUEST)
+
+
+@receiver(post_delete, sender=RejectedFriendship)
+def rejection_deleted(sender, instance, **kwargs):
+    if not instance.notif_deleted:
+        notifications.clear(instance.rejected_id, instance.rejecter_id, Notification.REJECTED_REQUEST)
+
+
+@receiver(pre_delete, sender=User)
+def delete_actor_notifications(sender, instance, **kwargs):
+    notifications.actor_deleted(instance.pk)
+
+
+# live updates (see live.py; the notifications publish their own): the confirmed
+# friendship to the user who asked for it, a new loan to the borrower
+
+@receiver(post_save, sender=Friendship)
+def publish_friendship(sender, instance, created, **kwargs):
+    if created and live.is_listening(instance.confirmed_user_id):
+        transaction.on_commit(lambda: live.publish(instance.confirmed_user_id, 'friendship', friend=instance.requested_user.username))
+
+
+@receiver(post_save, sender=Loan)
+def publish_loan(sender, instance, created, **kwargs):
+    if created and instance.borrower_id and live.is_listening(instance.borrower_id):
+        transaction.on_commit(lambda: live.publish(instance.borrower_id, 'loan', title=instance.book.title, owner=instance.owner.username))
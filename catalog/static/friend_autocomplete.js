@@ -0,0 +1,27 @@
+// fills the datalist of the friend request input with the users matching what is typed
+const friendInput = document.querySelector('#id_requested_friend');
+const friendList = document.querySelector('#friend-autocomplete');
+let friendTimer = null;
+
+
+friendInput.addEventListener('input', function () {
+    clearTimeout(friendTimer);
+    const prefix = friendInput.value.trim();
+    if (!prefix) {
+        friendList.innerHTML = '';
+        return;
+    }
+    friendTimer = setTimeout(function () {
+        fetch(friendList.dataset.url + '?q=' + encodeURIComponent(prefix), {credentials: 'same-origin'})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                friendList.innerHTML = '';
+                data.results.forEach(function (user) {
+                    const option = document.createElement('option');
+                    option.value = user.username;
+                    option.label = user.name;
+                    friendList.appendChild(option);
+                });
+            });
+    }, 200);
+});
@@ -0,0 +1,75 @@
+// live updates of the notification counter, new friends and loans (see catalog/live.py):
+// server-sent events when the site runs with the ASGI middleware, otherwise the counter
+// is polled every few seconds (while the page is visible)
+const live = document.querySelector('#live-updates');
+
+const liveTexts = {
+    request: function () { return 'Új barátnak jelölésed érkezett.'; },
+    rejected: function () { return 'Visszautasították az egyik jelölésedet.'; },
+    friendship: function (data) { return data.friend + ' visszaigazolta a jelölésedet, mostantól barátok vagytok.'; },
+    loan: function (data) { return data.owner + ' kölcsönadta neked: ' + data.title; },
+};
+
+
+function liveUnread(unread) {
+    document.querySelectorAll('[data-live-unread]').forEach(function (badge) {
+        badge.textContent = unread;
+        badge.classList.toggle('d-none', !unread);
+    });
+}
+
+
+function liveMessage(text) {
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-info alert-dismissible fade show';
+    alert.setAttribute('role', 'alert');
+    alert.textContent = text;
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'close';
+    close.dataset.dismiss = 'alert';
+    close.innerHTML = '<span aria-hidden="true">&times;</span>';
+    alert.appendChild(close);
+    live.appendChild(alert);
+}
+
+
+function liveEvent(event, data) {
+    if (event === 'notifications') {
+        liveUnread(data.unread);
+        if (data.kind) {
+            liveMessage(liveTexts[data.kind](data));
+        }
+    } else if (liveTexts[event]) {
+        liveMessage(liveTexts[event](data));
+    }
+}
+
+
+function livePoll() {
+    if (document.hidden) {
+        setTimeout(livePoll, 30000);
+        return;
+    }
+    fetch(live.dataset.pollUrl, {credentials: 'same-origin'})
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+            liveUnread(data.unread);
+            setTimeout(livePoll, data.interval * 1000);
+        })
+        .catch(function () { setTimeout(livePoll, 30000); });
+}
+
+
+if (live) {
+    const source = new EventSource(live.dataset.eventsUrl);
+    ['notifications', 'friendship', 'loan'].forEach(function (event) {
+        source.addEventListener(event, function (message) { liveEvent(event, JSON.parse(message.data)); });
+    });
+    source.addEventListener('error', function () {
+        // closed for good (204: no ASGI middleware): polling instead; otherwise it reconnects by itself
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(livePoll, 30000);
+        }
+    });
+}
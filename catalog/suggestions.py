@@ -0,0 +1,143 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F, Q
+
+from catalog import collation, friends
+from catalog.models import Book, FriendEdge, FriendRequest, MutualFriendCount, UserNameKey
+
+
+# Friend suggestions for the request-friend page: the friends of the user's friends,
+# ranked by the number of mutual friends and then by the number of authors both of
+# them recommend or wish for. The mutual friend counts are kept in MutualFriendCount
+# and changed incrementally: a new friendship a-b adds one to the pairs it connects
+# (b and every friend of a, a and every friend of b), an ended one takes them away, so
+# a change costs as many row updates as the two users have friends, and a read is the
+# first CANDIDATES rows of the user on the rank index, whatever the number of users.
+# The table holds a row per pair of users with a mutual friend: sum(friends²) rows.
+# The users already asked (in either direction) are filtered out on every read.
+
+CANDIDATES = 50
+
+# every count from the friend edges, for filling the table (migration 0012, seeding)
+
+REBUILD_SQL = '''
+    INSERT INTO catalog_mutualfriendcount (user_id, candidate_id, mutual)
+    SELECT a.friend_id, b.friend_id, COUNT(*)
+    FROM catalog_friendedge a INNER JOIN catalog_friendedge b ON a.user_id = b.user_id AND a.friend_id <> b.friend_id
+    GROUP BY a.friend_id, b.friend_id
+'''
+
+
+def rebuild():
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM catalog_mutualfriendcount')
+        cursor.execute(REBUILD_SQL)
+
+
+def _change(user_id, candidate_ids, delta):
+    # the pairs (user, candidate) and (candidate, user), in both directions
+    if not candidate_ids:
+        return
+    if delta > 0:
+        MutualFriendCount.objects.bulk_create(
+            [MutualFriendCount(user_id=user_id, candidate_id=candidate_id) for candidate_id in candidate_ids]
+            + [MutualFriendCount(user_id=candidate_id, candidate_id=user_id) for candidate_id in candidate_ids],
+            ignore_conflicts=True,
+        )
+    pairs = Q(user_id=user_id, candidate_id__in=candidate_ids) | Q(user_id__in=candidate_ids, candidate_id=user_id)
+    MutualFriendCount.objects.filter(pairs).update(mutual=F('mutual') + delta)
+    if delta < 0:
+        MutualFriendCount.objects.filter(pairs, mutual__lte=0).delete()
+
+
+def _friends_of(user_id, other_id):
+    # read from the edges, not the friend cache, which is only dropped after the commit
+    return list(FriendEdge.objects.filter(user_id=user_id).exclude(friend_id=other_id).values_list('friend_id', flat=True))
+
+
+def friendship_created(user_id, friend_id):
+    # called before the edges of the new friendship are written
+    _change(friend_id, _friends_of(user_id, friend_id), 1)
+    _change(user_id, _friends_of(friend_id, user_id), 1)
+
+
+def friendship_deleted(user_id, friend_id):
+    # called after the edges of the friendship are deleted
+    _change(friend_id, _friends_of(user_id, friend_id), -1)
+    _change(user_id, _friends_of(friend_id, user_id), -1)
+
+
+def user_deleted(user_id):
+    # the user's friends lose the user as a mutual friend of each other; this has to be
+    # done before the cascade, which deletes the user's edges before the friendships
+    friend_ids = list(FriendEdge.objects.filter(user_id=user_id).values_list('friend_id', flat=True))
+    pairs = MutualFriendCount.objects.filter(user_id__in=friend_ids, candidate_id__in=friend_ids)
+    pairs.update(mutual=F('mutual') - 1)
+    pairs.filter(mutual__lte=0).delete()
+
+
+def related_ids(user):
+    # the user, their friends and everyone with a friend request to or from them
+    requests = FriendRequest.objects.filter(Q(user=user) | Q(requested_friend=user)).values_list('user_id', 'requested_friend_id')
+    return {user.pk, *friends.friend_ids(user), *(user_id for pair in requests for user_id in pair)}
+
+
+def _shared_authors(user, candidate_ids):
+    flagged = Q(recommended=True) | Q(wished=True)
+    authors = set(Book.objects.filter(flagged, owner=user).values_list('last_name_author', 'first_name_author').distinct())
+    shared = dict.fromkeys(candidate_ids, 0)
+    if not authors:
+        return shared
+    books = (Book.objects.filter(flagged, owner__in=candidate_ids, last_name_author__in={last_name for last_name, first_name in authors})
+             .values_list('owner_id', 'last_name_author', 'first_name_author').distinct())
+    for owner_id, last_name, first_name in books:
+        if (last_name, first_name) in authors:
+            shared[owner_id] += 1
+    return shared
+
+
+def ranking(user, excluded):
+    # [(user id, mutual friends, shared authors)], best first
+    mutual = dict(
+        MutualFriendCount.objects.filter(user=user).exclude(candidate_id__in=excluded)
+        .order_by('-mutual', 'candidate_id').values_list('candidate_id', 'mutual')[:CANDIDATES]
+    )
+    shared = _shared_authors(user, list(mutual))
+    return sorted(((user_id, count, shared[user_id]) for user_id, count in mutual.items()), key=lambda row: (-row[1], -row[2], row[0]))
+
+
+def suggest(user, limit=10):
+    ranked = ranking(user, related_ids(user))[:limit]
+    users = User.objects.select_related('profile').in_bulk([user_id for user_id, mutual, shared in ranked])
+    return [(users[user_id], mutual, shared) for user_id, mutual, shared in ranked if user_id in users]
+
+
+# The autocomplete matches the beginning of the username, the last name or the first
+# name, accents and case folded away. Every user has a UserNameKey row for each of
+# them (written by the User signals), and a prefix is the range [prefix, next prefix)
+# of the key index, read in index order: a lookup reads about as many rows as it
+# returns, plus the skipped ones of the users already related to the user.
+
+NAME_FIELDS = ('username', 'last_name', 'first_name')
+
+
+def name_keys(user):
+    keys = {collation.fold(getattr(user, name)).strip() for name in NAME_FIELDS}
+    return [UserNameKey(user=user, key=key[:UserNameKey._meta.get_field('key').max_length]) for key in keys if key]
+
+
+def index_names(user):
+    UserNameKey.objects.filter(user=user).delete()
+    UserNameKey.objects.bulk_create(name_keys(user))
+
+
+def autocomplete(user, prefix, limit=10):
+    prefix = collation.fold(prefix.strip())
+    if not prefix:
+        return []
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    user_ids = (UserNameKey.objects.filter(key__gte=prefix, key__lt=upper, user__is_active=True)
+                .exclude(user_id__in=related_ids(user)).order_by('key', 'user_id')
+                .values_list('user_id', flat=True)[:limit * len(NAME_FIELDS)])
+    user_ids = list(dict.fromkeys(user_ids))[:limit]      # a user matching by more than one name
+    return collation.sort_objects(User.objects.filter(id__in=user_ids), lambda x: x.username)
@@ -0,0 +1,39 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# A small in-process worker pool (its work queue is the executor's own queue) for the
+# jobs that shouldn't run inside a request. With CATALOG_TASKS_EAGER = True (e.g. in
+# tests or management commands) the jobs run right away in the calling thread.
+# The pool belongs to the process that submitted the job, nothing else knows about
+# it: a job is lost when that process stops (a worker restart or timeout), so the
+# jobs keep their state in the database and can be run again (see accounts.py).
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'CATALOG_TASK_WORKERS', 2), thread_name_prefix='catalog-task')
+    return _executor
+
+
+def _run(function, args, kwargs):
+    try:
+        return function(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', function.__name__)
+    finally:
+        connection.close()      # every worker thread has its own database connection
+
+
+def submit(function, *args, **kwargs):
+    if getattr(settings, 'CATALOG_TASKS_EAGER', False):
+        return function(*args, **kwargs)
+    return _get_executor().submit(_run, function, args, kwargs)
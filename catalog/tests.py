@@ -0,0 +1,630 @@
+import datetime
+import io
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from catalog import accounts, exporter, feedcache, friendships, importer, live, notifications, suggestions
+from catalog.feeds import FriendFeed
+from catalog.forms import BookImportForm
+from catalog.models import Book, Friendship, Genre, Language, Loan, MutualFriendCount, Notification, Profile
+
+
+def make_user(username, **kwargs):
+    return User.objects.create_user(username=username, password='jelszo', **kwargs)
+
+
+def make_friends(user, friend):
+    return Friendship.objects.create(confirmed_user=user, requested_user=friend)
+
+
+def make_book(owner, author, title, **kwargs):
+    last_name, first_name = author.split(' ', 1)
+    kwargs.setdefault('genre', Genre.objects.get_or_create(name='Regény')[0])
+    kwargs.setdefault('language', Language.objects.get_or_create(name='magyar')[0])
+    return Book.objects.create(owner=owner, last_name_author=last_name, first_name_author=first_name, title=title, **kwargs)
+
+
+
+# Every book list has to run the same number of queries whatever the size of the library
+# (see the fetch plans in BookQuerySet): each list is counted with a small library, then
+# the libraries grow and the list must still run exactly as many queries.
+
+class ListingQueryCountTests(TestCase):
+
+    LISTINGS = [
+        ('mybooks', {}, ''),
+        ('mybooks-recom', {}, ''),
+        ('mybooks-loaned', {}, ''),
+        ('mybooks-wished', {}, ''),
+        ('mybooks', {}, '?after='),
+        ('wished-matches', {}, ''),
+        ('book-search', {}, '?q=jokai'),
+        ('borrowed-books', {}, ''),
+        ('recom-books-byowner', {}, ''),
+        ('recom-books-byauthor', {}, ''),
+        ('recom-books-bylang', {}, ''),
+        ('recom-books-bygenre', {}, ''),
+        ('wished-books-byowner', {}, ''),
+        ('wished-books-byauthor', {}, ''),
+        ('recom-books-byauthor', {}, '?after='),
+        ('friend-recom-books', {'username': 'barat1'}, ''),
+        ('friend-wished-books', {'username': 'barat1'}, ''),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genres = [Genre.objects.create(name=name) for name in ('Regény', 'Vers')]
+        cls.languages = [Language.objects.create(name=name) for name in ('magyar', 'angol')]
+        cls.user = make_user('olvaso')
+        cls.friends = [make_user(f'barat{number}') for number in (1, 2)]
+        for friend in cls.friends:
+            make_friends(cls.user, friend)
+
+    def add_books(self, count):
+        for number in range(count):
+            genre, language = self.genres[number % 2], self.languages[number % 2]
+            book = dict(last_name_author='Jókai', first_name_author='Mór', genre=genre, language=language)
+            Book.objects.create(owner=self.user, title=f'Saját {number}', **book)
+            Book.objects.create(owner=self.user, title=f'Ajánlott {number}', recommended=True, **book)
+            Book.objects.create(owner=self.user, title=f'Közös {number}', wished=True, **book)
+            Book.objects.create(owner=self.user, title=f'Nem-felhasználótól {number}', owner_nonuser='Kati néni', **book)
+            for friend in self.friends:
+                Book.objects.create(owner=self.user, title=f'Kölcsönadott {number}', recommended=True, loaned=True, borrower=friend, loan_date=datetime.date.today(), **book)
+                Book.objects.create(owner=friend, title=f'Kölcsönkért {number}', recommended=True, loaned=True, borrower=self.user, loan_date=datetime.date.today(), **book)
+                Book.objects.create(owner=friend, title=f'Közös {number}', recommended=True, **book)
+                Book.objects.create(owner=friend, title=f'Kívánt {number}', wished=True, **book)
+
+    def get(self, name, kwargs, query):
+        cache.clear()       # the friend sets and the feed pages are cached
+        response = self.client.get(reverse(name, kwargs=kwargs) + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_depend_on_library_size(self):
+        self.client.force_login(self.user)
+        self.add_books(2)
+        counts = []
+        for name, kwargs, query in self.LISTINGS:
+            with CaptureQueriesContext(connection) as queries:
+                self.get(name, kwargs, query)
+            counts.append(len(queries))
+
+        self.add_books(20)
+        for (name, kwargs, query), count in zip(self.LISTINGS, counts):
+            with self.subTest(listing=name + query):
+                with self.assertNumQueries(count):
+                    self.get(name, kwargs, query)
+
+
+
+class FriendFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('olvaso')
+        cls.anna, cls.bela, cls.stranger = make_user('anna'), make_user('Béla'), make_user('idegen')
+        make_friends(cls.user, cls.anna)
+        make_friends(cls.bela, cls.user)
+        today = datetime.date.today()
+        cls.old = make_book(cls.anna, 'Arany János', 'Toldi', recommended=True, loaned=True, borrower_nonuser='Kati', loan_date=today - datetime.timedelta(days=30))
+        cls.new = make_book(cls.bela, 'Ady Endre', 'Versek', recommended=True, loaned=True, borrower_nonuser='Kati', loan_date=today)
+        cls.home = make_book(cls.bela, 'Örkény István', 'Tóték', recommended=True)
+        make_book(cls.anna, 'Babits Mihály', 'Jónás könyve', wished=True)
+        make_book(cls.stranger, 'Ady Endre', 'Idegen', recommended=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_author_order(self):
+        self.assertEqual(list(FriendFeed('recommended').books(self.user)), [self.new, self.old, self.home])
+
+    def test_loan_date_order_puts_books_at_home_last(self):
+        self.assertEqual(list(FriendFeed('recommended', order='loan_date').books(self.user)), [self.new, self.old, self.home])
+        self.assertEqual(list(FriendFeed('recommended', group_by='owner', order='loan_date').books(self.user)), [self.old, self.new, self.home])
+
+    def test_owner_groups_in_collation_order(self):
+        self.assertEqual(list(FriendFeed('recommended', group_by='owner').books(self.user)), [self.old, self.new, self.home])
+
+    def test_unknown_options(self):
+        for kwargs in ({'flag': 'loaned'}, {'flag': 'wished', 'group_by': 'title'}, {'flag': 'wished', 'order': 'title'}):
+            with self.assertRaises(ValueError):
+                FriendFeed(**kwargs)
+
+
+
+class ExportImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('olvaso')
+        cls.friend = make_user('barat')
+        make_friends(cls.user, cls.friend)
+        make_book(cls.user, 'Jókai Mór', 'Az arany ember', recommended=True, comment='Kedvencem, "idézőjelekkel", vesszővel')
+        make_book(cls.user, 'Móricz Zsigmond', 'Légy jó mindhalálig', wished=True)
+        make_book(cls.user, 'Arany János', 'Toldi', recommended=True, loaned=True, borrower=cls.friend, loan_date=datetime.date(2020, 5, 1))
+        make_book(cls.user, 'Örkény István', 'Tóték', recommended=True, loaned=True, borrower_nonuser='Kati néni', loan_date=datetime.date(2021, 1, 2))
+        make_book(cls.user, 'Szabó Magda', 'Az ajtó', owner_nonuser='a könyvtár', loan_date=datetime.date(2022, 3, 4))
+
+    def test_round_trip(self):
+        for file_format in exporter.FORMATS:
+            with self.subTest(file_format=file_format):
+                exported = ''.join(exporter.export_books(self.user, file_format))
+                copy = make_user(f'masolat-{file_format}')
+                make_friends(copy, self.friend)
+                result = importer.import_books(copy, io.StringIO(exported), file_format)
+                self.assertEqual((result.created, result.failed, result.errors), (5, 0, []))
+                self.assertEqual(list(exporter.book_rows(copy)), list(exporter.book_rows(self.user)))
+                self.assertEqual(Book.objects.filter(owner=copy, owner_nonuser='a könyvtár').count(), 1)
+                self.assertEqual(Loan.objects.filter(owner=copy).open().count(), 2)
+
+    def test_uploaded_csv_with_multiline_comment(self):
+        content = 'last_name_author,first_name_author,title,genre,language,comment\r\nJókai,Mór,A kőszívű ember fiai,Regény,magyar,"első sor\r\nmásodik sor"\r\n'
+        result = importer.import_uploaded_file(self.friend, SimpleUploadedFile('konyvek.csv', content.encode('utf-8-sig')))
+        self.assertEqual((result.created, result.errors), (1, []))
+        self.assertEqual(Book.objects.get(owner=self.friend).comment, 'első sor\r\nmásodik sor')
+
+    def test_book_of_nonuser_needs_loan_date(self):
+        rows = [(1, {'last_name_author': 'Szabó', 'first_name_author': 'Magda', 'title': 'Az ajtó', 'owner_nonuser': 'a könyvtár'})]
+        result = importer.BookImporter(self.friend).run(rows)
+        self.assertEqual((result.created, result.failed), (0, 1))
+
+    def test_import_form_accepts_the_importer_formats(self):
+        for extension in ('csv', 'json', 'ndjson', 'jsonl'):
+            with self.subTest(extension=extension):
+                name = f'konyvek.{extension}'
+                self.assertTrue(BookImportForm(files={'file': SimpleUploadedFile(name, b'[]')}).is_valid())
+                importer.read_rows(io.StringIO(''), importer.format_from_name(name))      # a known format
+
+
+
+class ProfileThumbnailTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = make_user('olvaso')
+        self.profile = self.user.profile
+        self.profile.image = 'profile_pics/kep.png'
+        self.profile.save()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'profile_pics'), exist_ok=True)
+        Image.new('RGB', (800, 600)).save(os.path.join(settings.MEDIA_ROOT, 'profile_pics', 'kep.png'))
+
+    def test_original_until_thumbnails_are_made(self):
+        self.assertFalse(Profile.objects.get(user=self.user).thumbnails_ready)
+        self.assertEqual(self.profile.avatar_url, '/media/profile_pics/kep.png')
+
+        Profile.make_thumbnails('profile_pics/kep.png')
+        profile = Profile.objects.get(user=self.user)
+        self.assertTrue(profile.thumbnails_ready)
+        with mock.patch('django.core.files.storage.FileSystemStorage.exists', side_effect=AssertionError('storage checked')):
+            self.assertEqual(profile.avatar_url, '/media/profile_pics/thumbs/kep_130px.png')
+            self.assertEqual(profile.picture_url, '/media/profile_pics/thumbs/kep_300px.png')
+        with Image.open(os.path.join(settings.MEDIA_ROOT, 'profile_pics', 'thumbs', 'kep_300px.png')) as thumbnail:
+            self.assertEqual(thumbnail.size, (300, 225))
+
+    def test_new_picture_resets_the_flag(self):
+        stale = Profile.objects.get(user=self.user)      # loaded before the copies were made
+        Profile.make_thumbnails('profile_pics/kep.png')
+        stale.save()
+        self.assertTrue(Profile.objects.get(user=self.user).thumbnails_ready)
+
+        profile = Profile.objects.get(user=self.user)
+        profile.image = 'profile_pics/uj.png'
+        profile.save()
+        self.assertFalse(Profile.objects.get(user=self.user).thumbnails_ready)
+        Profile.make_thumbnails('profile_pics/kep.png')       # a late task of the old picture
+        self.assertFalse(Profile.objects.get(user=self.user).thumbnails_ready)
+
+
+
+class LoginTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('olvaso', first_name='Anna', last_name='Kiss')
+        cache.clear()
+
+    def test_login_reads_no_profile_and_no_file(self):
+        # the budget of a login: the user is read and its last_login written, nothing else;
+        # the session queries (and their savepoints) depend on the session backend, not on us
+        with mock.patch('PIL.Image.open') as image_open, mock.patch('builtins.open', wraps=open) as file_open:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.client.login(username='olvaso', password='jelszo'))
+        self.assertEqual(image_open.call_count, 0)
+        self.assertEqual(file_open.call_count, 0)
+        statements = [re.match(r'(\w+) (?:.*? FROM )?"(\w+)"', query['sql']).groups() for query in queries
+                      if 'django_session' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(statements, [('SELECT', 'auth_user'), ('UPDATE', 'auth_user')])
+
+    def test_login_keeps_the_feed_version(self):
+        version = feedcache.versions([self.user.pk])
+        self.client.login(username='olvaso', password='jelszo')
+        self.assertEqual(feedcache.versions([self.user.pk]), version)
+
+    def test_new_name_bumps_the_feed_version(self):
+        version = feedcache.versions([self.user.pk])
+        user = User.objects.get(pk=self.user.pk)
+        user.last_name = 'Nagy'
+        user.save()
+        self.assertNotEqual(feedcache.versions([self.user.pk]), version)
+
+
+
+class SuggestionTests(TestCase):
+
+    def setUp(self):
+        self.users = {name: make_user(name) for name in ('anna', 'bela', 'cili', 'dani', 'emil')}
+
+    def counts(self):
+        return set(MutualFriendCount.objects.values_list('user__username', 'candidate__username', 'mutual'))
+
+    def assert_counts_match_the_edges(self):
+        counts = self.counts()
+        suggestions.rebuild()
+        self.assertEqual(counts, self.counts())
+
+    def test_counts_follow_friendships(self):
+        u = self.users
+        make_friends(u['anna'], u['bela'])
+        make_friends(u['bela'], u['cili'])
+        make_friends(u['dani'], u['bela'])
+        make_friends(u['anna'], u['dani'])
+        make_friends(u['cili'], u['dani'])
+        self.assertTrue({('anna', 'cili', 2), ('anna', 'bela', 1)} <= self.counts())
+        self.assert_counts_match_the_edges()
+
+        friendships.unfriend(u['bela'], u['dani'])
+        self.assertIn(('anna', 'cili', 2), self.counts())
+        self.assertFalse(MutualFriendCount.objects.filter(user=u['anna'], candidate=u['bela']).exists())
+        self.assert_counts_match_the_edges()
+
+        u['dani'].delete()
+        self.assertIn(('anna', 'cili', 1), self.counts())
+        self.assert_counts_match_the_edges()
+
+    def test_suggestions_rank_by_mutual_friends(self):
+        u = self.users
+        for friend in ('bela', 'cili'):
+            make_friends(u['anna'], u[friend])
+        make_friends(u['bela'], u['dani'])
+        make_friends(u['cili'], u['dani'])
+        make_friends(u['cili'], u['emil'])
+        cache.clear()
+        self.assertEqual([(user.username, mutual) for user, mutual, shared in suggestions.suggest(u['anna'])], [('dani', 2), ('emil', 1)])
+
+        friendships.send_request(u['anna'], u['dani'])      # already asked
+        self.assertEqual([user.username for user, mutual, shared in suggestions.suggest(u['anna'])], ['emil'])
+
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()       # the friend sets of the users of earlier tests (with the same ids)
+        self.user = make_user('olvaso')
+        make_user('jozsi', last_name='Kovács', first_name='József')
+        make_user('kata', last_name='Szabó', first_name='Katalin')
+        make_user('kovacs', last_name='Kovács', first_name='Kornél')
+        make_user('regi', last_name='Kovács', first_name='Ödön', is_active=False)
+
+    def usernames(self, prefix):
+        return [user.username for user in suggestions.autocomplete(self.user, prefix)]
+
+    def test_prefix_of_any_name_without_accents(self):
+        self.assertEqual(self.usernames('KOVA'), ['jozsi', 'kovacs'])
+        self.assertEqual(self.usernames('józs'), ['jozsi'])
+        self.assertEqual(self.usernames('ka'), ['kata'])
+        self.assertEqual(self.usernames('ödön'), [])
+        self.assertEqual(self.usernames(' '), [])
+
+    def test_related_users_and_renames(self):
+        friendships.send_request(User.objects.get(username='kovacs'), self.user)
+        self.assertEqual(self.usernames('kov'), ['jozsi'])
+
+        kata = User.objects.get(username='kata')
+        kata.last_name = 'Kovács'
+        kata.save()
+        self.assertEqual(self.usernames('kov'), ['jozsi', 'kata'])
+        self.assertEqual(self.usernames('szab'), [])
+
+
+
+class LoanLedgerTests(TestCase):
+
+    def setUp(self):
+        self.owner = make_user('tulajdonos')
+        self.friend = make_user('barat')
+        self.book = make_book(self.owner, 'Jókai Mór', 'Az arany ember', recommended=True)
+
+    def lend(self, book, **fields):
+        book.loaned = True
+        book.loan_date = fields.pop('loan_date', datetime.date.today())
+        for name, value in fields.items():
+            setattr(book, name, value)
+        book.save()
+
+    def test_lend_correct_and_return(self):
+        self.assertFalse(Loan.objects.exists())
+        self.lend(self.book, borrower=self.friend)
+        loan = Loan.objects.get()
+        self.assertEqual((loan.owner, loan.borrower, loan.returned_at), (self.owner, self.friend, None))
+
+        book = Book.objects.get(pk=self.book.pk)
+        book.borrower, book.borrower_nonuser = None, 'Kati néni'
+        book.comment = 'Vigyázz rá!'
+        book.save()
+        loan = Loan.objects.get()
+        self.assertEqual((loan.borrower, loan.borrower_nonuser, loan.returned_at), (None, 'Kati néni', None))
+
+        book.loaned, book.borrower_nonuser, book.loan_date = False, None, None
+        book.save()
+        self.assertIsNotNone(Loan.objects.get().returned_at)
+
+        self.lend(book, borrower=self.friend)
+        self.assertEqual(Loan.objects.count(), 2)
+        self.assertEqual(Loan.objects.open().get().borrower, self.friend)
+
+    def test_other_edits_and_partial_loads_keep_the_ledger(self):
+        self.lend(self.book, borrower=self.friend)
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = 'Az arany ember (2. kiadás)'
+        book.save()
+        Book.objects.only('book_id', 'title').get(pk=self.book.pk).save()
+        self.assertEqual(Loan.objects.count(), 1)
+        self.assertEqual(Loan.objects.open().count(), 1)
+
+    def test_overdue(self):
+        self.lend(self.book, borrower=self.friend, loan_date=datetime.date.today() - datetime.timedelta(days=61))
+        other = make_book(self.owner, 'Arany János', 'Toldi', recommended=True)
+        self.lend(other, borrower=self.friend)
+        self.assertEqual(list(Loan.objects.overdue().values_list('book', flat=True)), [self.book.pk])
+        self.assertEqual(Loan.objects.overdue(days=100).count(), 0)
+
+
+
+class AccountDeletionTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('torlendo')
+        self.owner = make_user('tulajdonos')
+        self.borrower = make_user('kolcsonzo')
+        self.lent_to_user = make_book(self.owner, 'Jókai Mór', 'Az arany ember', recommended=True, loaned=True, borrower=self.user, loan_date=datetime.date(2020, 1, 1))
+        self.lent_by_user = make_book(self.user, 'Arany János', 'Toldi', recommended=True, loaned=True, borrower=self.borrower, loan_date=datetime.date(2020, 2, 2))
+        for number in range(3):
+            make_book(self.user, 'Móricz Zsigmond', f'Regény {number}', wished=True)
+
+    def assert_handed_over(self):
+        book = Book.objects.get(pk=self.lent_to_user.pk)
+        self.assertEqual((book.owner, book.borrower, book.borrower_nonuser, book.loaned), (self.owner, None, 'torlendo', True))
+        loan = Loan.objects.get(book=book)
+        self.assertEqual((loan.owner, loan.borrower, loan.borrower_nonuser, loan.returned_at), (self.owner, None, 'torlendo', None))
+
+        book = Book.objects.get(pk=self.lent_by_user.pk)
+        self.assertEqual((book.owner, book.owner_nonuser, book.borrower, book.loaned, book.recommended), (self.borrower, 'torlendo', None, False, False))
+        self.assertEqual(book.loan_date, datetime.date(2020, 2, 2))
+        self.assertFalse(Loan.objects.filter(borrower=self.borrower).exists())
+
+        self.assertFalse(User.objects.filter(username='torlendo').exists())
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_small_account_is_deleted_at_once(self):
+        self.assertIsNone(accounts.request_deletion(self.user))
+        self.assert_handed_over()
+
+    @override_settings(CATALOG_ACCOUNT_DELETE_SYNC_LIMIT=2, CATALOG_TASKS_EAGER=True)
+    def test_big_account_is_deleted_in_batches(self):
+        with mock.patch.object(accounts, 'BATCH_SIZE', 2):
+            token = accounts.request_deletion(self.user)
+        self.assert_handed_over()
+        self.assertEqual(accounts.progress(token), {'done': 3, 'total': 3, 'finished': True})
+
+    @override_settings(CATALOG_ACCOUNT_DELETE_SYNC_LIMIT=2)
+    def test_progress_is_read_from_the_database(self):
+        # as in another process than the one deleting: nothing is shared but the database
+        with mock.patch('catalog.tasks.submit') as submit:
+            token = accounts.request_deletion(self.user)
+        cache.clear()
+        self.assertEqual(accounts.progress(token), {'done': 0, 'total': 3, 'finished': False})
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+        Book.objects.filter(pk=Book.objects.filter(owner=self.user).first().pk).delete()
+        self.assertEqual(accounts.progress(token), {'done': 1, 'total': 3, 'finished': False})
+        submit.assert_called_once_with(accounts.delete_account, self.user.pk)
+        accounts.delete_account(self.user.pk)
+        self.assertEqual(accounts.progress(token), {'done': 3, 'total': 3, 'finished': True})
+        self.assertIsNone(accounts.progress('nem-token'))
+
+
+
+class NotificationCounterTests(TestCase):
+
+    def setUp(self):
+        self.users = {name: make_user(name) for name in ('anna', 'bela', 'cili', 'dani')}
+
+    def unread(self, name):
+        counter = Profile.objects.get(user=self.users[name]).unread_notifications
+        self.assertEqual(counter, Notification.objects.filter(recipient=self.users[name]).count())
+        return counter
+
+    def test_counter_follows_the_requests(self):
+        u = self.users
+        for name in ('bela', 'cili', 'dani'):
+            friendships.send_request(u[name], u['anna'])
+        self.assertEqual(self.unread('anna'), 3)
+
+        friendships.confirm(u['anna'], u['bela'])
+        self.assertEqual(self.unread('anna'), 2)
+
+        friendships.reject(u['anna'], u['cili'])
+        self.assertEqual((self.unread('anna'), self.unread('cili')), (1, 1))
+        friendships.dismiss_rejection(u['cili'], u['anna'])
+        self.assertEqual(self.unread('cili'), 0)
+
+        friendships.withdraw(u['dani'], u['anna'])
+        self.assertEqual(self.unread('anna'), 0)
+
+        self.assertEqual(notifications.compact(days=0), (1, 1))
+        self.assertEqual((self.unread('anna'), self.unread('bela'), self.unread('cili')), (0, 0, 0))
+
+    def test_deleted_actor_takes_the_notifications(self):
+        u = self.users
+        friendships.send_request(u['bela'], u['anna'])
+        friendships.send_request(u['cili'], u['anna'])
+        friendships.send_request(u['anna'], u['dani'])
+        friendships.reject(u['dani'], u['anna'])
+        self.assertEqual((self.unread('anna'), self.unread('dani')), (3, 0))
+
+        u['bela'].delete()
+        self.assertEqual(self.unread('anna'), 2)
+        u['dani'].delete()
+        self.assertEqual(self.unread('anna'), 1)
+
+    def test_notification_page(self):
+        u = self.users
+        friendships.send_request(u['bela'], u['anna'])
+        friendships.send_request(u['anna'], u['cili'])
+        friendships.reject(u['cili'], u['anna'])
+        self.client.force_login(u['anna'])
+        response = self.client.get(reverse('friend-notif'))
+        self.assertEqual([n.actor for n in response.context['requests']], [u['bela']])
+        self.assertEqual([n.actor for n in response.context['rejected_requests']], [u['cili']])
+
+        self.client.post(reverse('friend-notif'), {'user_to_handle': 'dcili'})
+        self.client.post(reverse('friend-notif'), {'user_to_handle': 'cbela'})
+        self.assertEqual(self.unread('anna'), 0)
+        self.assertTrue(Friendship.objects.filter(confirmed_user=u['bela'], requested_user=u['anna']).exists())
+
+    def test_drifted_counter_is_clamped(self):
+        u = self.users
+        friendships.send_request(u['bela'], u['anna'])
+        friendships.send_request(u['cili'], u['anna'])
+        Profile.objects.filter(user=u['anna']).update(unread_notifications=1)
+        notifications.delete(Notification.objects.filter(recipient=u['anna']))
+        self.assertEqual(self.unread('anna'), 0)
+
+    def test_dashboard_request_counters(self):
+        u = self.users
+        friendships.send_request(u['bela'], u['anna'])
+        friendships.send_request(u['cili'], u['anna'])
+        friendships.send_request(u['anna'], u['dani'])
+        friendships.reject(u['dani'], u['anna'])
+        friendships.confirm(u['anna'], u['bela'])
+        self.client.force_login(u['anna'])
+        response = self.client.get(reverse('index'))
+        self.assertEqual((response.context['num_req_friend'], response.context['num_requests']), (0, 1))
+
+
+
+class LiveUpdateTests(TransactionTestCase):
+    # the events are published after the commit
+
+    class Recorder:
+        def __init__(self):
+            self.events = []
+
+        def put(self, event):
+            self.events.append(event)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('catalog.tasks.submit')       # no thumbnails of the default picture
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.anna, self.bela = make_user('anna'), make_user('bela')
+
+    def listen(self, user):
+        recorder = live._subscribe(user.pk, self.Recorder())
+        self.addCleanup(live._unsubscribe, user.pk, recorder)
+        return recorder
+
+    def test_friend_request_and_confirmation(self):
+        anna, bela = self.listen(self.anna), self.listen(self.bela)
+        friendships.send_request(self.bela, self.anna)
+        self.assertEqual(anna.events, [{'event': 'notifications', 'data': {'unread': 1, 'kind': Notification.FRIEND_REQUEST}}])
+
+        friendships.confirm(self.anna, self.bela)
+        self.assertIn({'event': 'notifications', 'data': {'unread': 0, 'kind': None}}, anna.events)
+        self.assertEqual(bela.events, [{'event': 'friendship', 'data': {'friend': 'anna'}}])
+
+    def test_loan(self):
+        bela = self.listen(self.bela)
+        make_book(self.anna, 'Jókai Mór', 'Az arany ember', recommended=True, loaned=True, borrower=self.bela, loan_date=datetime.date.today())
+        self.assertEqual(bela.events, [{'event': 'loan', 'data': {'title': 'Az arany ember', 'owner': 'anna'}}])
+
+    def test_nobody_listening(self):
+        friendships.send_request(self.bela, self.anna)
+        self.assertFalse(live.is_listening(self.anna.pk))
+
+    def test_fallback_endpoints_answer_at_once(self):
+        friendships.send_request(self.bela, self.anna)
+        self.client.force_login(self.anna)
+        self.assertEqual(self.client.get(reverse('live-events')).status_code, 204)
+        response = self.client.get(reverse('live-poll'))
+        self.assertEqual(response.json(), {'unread': 1, 'interval': live.POLL_INTERVAL})
+
+
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('olvaso')
+        self.friend = make_user('barat')
+        make_friends(self.user, self.friend)
+        self.client.force_login(self.user)
+
+    def test_etag_changes_after_patch(self):
+        book = make_book(self.user, 'Jókai Mór', 'A kőszívű ember fiai')
+        url = reverse('api-books')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        response = self.client.patch(reverse('api-book', args=[book.pk]), {'title': 'Az arany ember'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['title'], 'Az arany ember')
+
+    def titles(self, url, after):
+        response = self.client.get(url, {'limit': 2, 'after': after})
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.json()['results']], response.json()['next']
+
+    def test_cursor_survives_deleted_last_row(self):
+        books = [make_book(self.user, 'Jókai Mór', title) for title in ('A', 'B', 'C', 'D')]
+        url = reverse('api-books')
+        titles, after = self.titles(url, '')
+        self.assertEqual(titles, ['A', 'B'])
+        books[1].delete()
+        self.assertEqual(self.titles(url, after), (['C', 'D'], None))
+
+    def test_cursor_survives_unflagged_last_row(self):
+        books = [make_book(self.friend, 'Jókai Mór', title, wished=True) for title in ('A', 'B', 'C')]
+        url = reverse('api-feed', args=['wished'])
+        titles, after = self.titles(url, '')
+        self.assertEqual(titles, ['A', 'B'])
+        books[1].wished = False
+        books[1].save()
+        self.assertEqual(self.titles(url, after), (['C'], None))
+
+    def test_invalid_cursor(self):
+        make_book(self.user, 'Jókai Mór', 'A')
+        for after in ('nem-kurzor', 'e30', 'WzFd'):      # not base64 JSON, an object, a list of the wrong length
+            with self.subTest(after=after):
+                self.assertEqual(self.client.get(reverse('api-books'), {'after': after}).status_code, 404)
\ No newline at end of file
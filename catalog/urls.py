@@ -1,5 +1,6 @@
 from django.urls import path
-from . import views
+from . import api, views
+from .feeds import FriendFeed
 
 urlpatterns = [
     path('', views.index, name='index'),
@@ -7,22 +8,26 @@ urlpatterns = [
     path('mybooks/recommended/', views.MyBooksRecommendedListView.as_view(), name='mybooks-recom'),
     path('mybooks/loaned/', views.MyBooksLoanedListView.as_view(), name='mybooks-loaned'),
     path('mybooks/wished/', views.MyBooksWishedListView.as_view(), name='mybooks-wished'),
+    path('mybooks/wished/matches/', views.WishedMatchesListView.as_view(), name='wished-matches'),
+    path('mybooks/export', views.mybooks_export, name='mybooks-export'),
     path('mybooks/<uuid:pk>', views.BookDetailView.as_view(), name='book-detail'),
+    path('search/', views.BookSearchListView.as_view(), name='book-search'),
 ]
 
 urlpatterns += [   
     path('borrowedbooks/', views.BorrowedBooksByUserListView.as_view(), name='borrowed-books'),
     path('borrowedbooks/fromnonusers', views.book_of_nonuser_create_form, name='borrowed-books-fromnonusers'),
-    path('recommendedbooks/byowner', views.RecommendedBooksByOwnerListView.as_view(), name='recom-books-byowner'),
-    path('recommendedbooks/byauthor', views.RecommendedBooksByAuthorListView.as_view(), name='recom-books-byauthor'),
-    path('recommendedbooks/bylanguage', views.RecommendedBooksByLanguageListView.as_view(), name='recom-books-bylang'),
-    path('recommendedbooks/bygenre', views.RecommendedBooksByGenreListView.as_view(), name='recom-books-bygenre'),
-    path('wishedbooks/byowner', views.WishedBooksByOwnerListView.as_view(), name='wished-books-byowner'),
-    path('wishedbooks/byauthor', views.WishedBooksByAuthorListView.as_view(), name='wished-books-byauthor'),
+    path('recommendedbooks/byowner', views.FriendFeedListView.as_view(feed=FriendFeed('recommended', group_by='owner'), context_object_name='recom_books', template_name='catalog/recom_books_byowner.html', title="Ajánlott könyvek - barátok szerint rendezve"), name='recom-books-byowner'),
+    path('recommendedbooks/byauthor', views.FriendFeedListView.as_view(feed=FriendFeed('recommended'), context_object_name='recom_books', template_name='catalog/recom_books_byauthor.html', title="Ajánlott könyvek - szerző szerint rendezve"), name='recom-books-byauthor'),
+    path('recommendedbooks/bylanguage', views.FriendFeedListView.as_view(feed=FriendFeed('recommended', group_by='language'), context_object_name='recom_books', template_name='catalog/recom_books_bylang.html', title="Ajánlott könyvek - nyelvek szerint rendezve"), name='recom-books-bylang'),
+    path('recommendedbooks/bygenre', views.FriendFeedListView.as_view(feed=FriendFeed('recommended', group_by='genre'), context_object_name='recom_books', template_name='catalog/recom_books_bygenre.html', title="Ajánlott könyvek - műfaj szerint rendezve"), name='recom-books-bygenre'),
+    path('wishedbooks/byowner', views.FriendFeedListView.as_view(feed=FriendFeed('wished', group_by='owner'), context_object_name='wished_books', template_name='catalog/wished_books_byowner.html', title="Kívánságlisták - barát szerint rendezve"), name='wished-books-byowner'),
+    path('wishedbooks/byauthor', views.FriendFeedListView.as_view(feed=FriendFeed('wished'), context_object_name='wished_books', template_name='catalog/wished_books_byauthor.html', title="Kívánságlisták - szerző szerint rendezve"), name='wished-books-byauthor'),
 ]
 
 urlpatterns += [  
     path('book/create/', views.book_create_form, name='book-create'),
+    path('book/import/', views.book_import, name='book-import'),
     path('book/<uuid:pk>/update/', views.book_update_form, name='book-update'),
     path('book/<uuid:pk>/delete/', views.BookDelete.as_view(), name='book-delete'),
     path('book/<uuid:pk>/update/nonuserbook', views.book_of_nonuser_update_form, name='book-of-nonuser-update'),
@@ -33,8 +38,26 @@ urlpatterns += [
     path('myfriends/', views.myfriends, name='myfriends'),
     path('myfriends/<int:pk>/deletefriend/', views.delete_friend, name='delete-friend'),
     path('myfriends/request/', views.request_friend, name='request-friend'),
+    path('myfriends/request/autocomplete/', views.request_friend_autocomplete, name='request-friend-autocomplete'),
     path('myfriends/request/<int:pk>/withdrawrequest/', views.withdraw_request, name='withdraw-request'),
     path('myfriends/friendnotifications/', views.friend_notif, name='friend-notif'),
     path('myfriends/<str:username>/recommendedbooks/', views.FriendRecommendedBooksListView.as_view(), name='friend-recom-books'),
     path('myfriends/<str:username>/wishedbooks/', views.FriendWishedBooksListView.as_view(), name='friend-wished-books'),
-]
\ No newline at end of file
+]
+
+urlpatterns += [
+    path('account/deletion/<str:token>/', views.account_deletion_progress, name='account-deletion-progress'),
+    path('live/events/', views.live_events, name='live-events'),
+    path('live/poll/', views.live_poll, name='live-poll'),
+]
+
+urlpatterns += [
+    path('api/books/', api.books, name='api-books'),
+    path('api/books/<uuid:pk>/', api.book, name='api-book'),
+    path('api/feeds/<str:flag>/', api.feed, name='api-feed'),
+    path('api/friends/', api.friend_list, name='api-friends'),
+    path('api/friend-requests/', api.friend_requests, name='api-friend-requests'),
+    path('api/friend-requests/<str:username>/', api.friend_request, name='api-friend-request'),
+    path('api/friend-requests/<str:username>/<str:answer>/', api.friend_request_answer, name='api-friend-request-answer'),
+    path('api/friends/<str:username>/', api.friend, name='api-friend'),
+]
@@ -1,25 +1,28 @@
+import csv
 import datetime
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
-from django.db.models import Q
+from django.db import IntegrityError
+from django.db.models import Count, Q
 
 from django.views import generic
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
-from django.contrib.auth import login, authenticate, update_session_auth_hash
+from django.contrib.auth import login, logout, authenticate, update_session_auth_hash
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, PasswordChangeForm
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 
-from catalog.models import Book, Genre, Language, Friendship, FriendRequest, RejectedFriendship
-from catalog.forms import FriendRequestForm, RequestManagementForm, SignUpForm, BookCreateForm, UserUpdateForm, ProfileUpdateForm, BookOfNonUserCreateForm
+from catalog.models import Book, FriendRequest, Loan, Notification
+from catalog.forms import FriendRequestForm, RequestManagementForm, SignUpForm, BookCreateForm, UserUpdateForm, ProfileUpdateForm, BookOfNonUserCreateForm, BookImportForm
 
-from pyuca import Collator
-
-c = Collator()
+from catalog import accounts, collation, exporter, friends, friendships, importer, live, matching, notifications, search, suggestions
+from catalog.pagination import KeysetPaginationMixin
+from catalog.feedcache import FeedCacheMixin
 
 
 # I. VIEWS CONNECTED TO USERS (SIGNUP, LOGIN, PROFILE, DELETE)
@@ -85,28 +88,26 @@ def profile(request):
 @login_required
 def delete_profile(request):             # users can delete themselves 
     if request.method == 'POST':
-        user = request.user
-        user_instance = User.objects.get(username=user)
-
-        # the deleted user's borrowed books:
-        Book.objects.filter(borrower=user).update(borrower=None, borrower_nonuser=user.username)
-        # the deleted user's loaned books:
-        books_loaned = Book.objects.filter(owner=user, borrower__isnull=False)
-        for book in books_loaned:
-            book.owner = book.borrower
-            book.borrower = None
-            book.owner_nonuser = user.username
-            book.recommended = False
-            book.loaned = False
-            book.save()
-
-        user_instance.delete()
-        return redirect('login')   
+        token = accounts.request_deletion(request.user)
+        if token is None:
+            return redirect('login')
+
+        # a big library is deleted in the background, the user is already deactivated
+        logout(request)
+        return redirect('account-deletion-progress', token=token)
     
     return render(request, 'delete_profile.html', {})
 
 
 
+def account_deletion_progress(request, token):
+    progress = accounts.progress(token)
+    if progress is None:
+        raise Http404('Ismeretlen törlés.')
+    return render(request, 'delete_profile_progress.html', {'progress': progress})
+
+
+
 # II. VIEWS CONNECTED TO FRIENDSHIPS   
 
 @login_required
@@ -115,19 +116,18 @@ def request_friend(request):
         form = FriendRequestForm(request.user, request.POST)
         if form.is_valid():
             user = request.user
-            rf = form.cleaned_data['requested_friend']
-            rf_instance = User.objects.get(username=rf)
-            instance = FriendRequest(user=user, requested_friend=rf_instance)
-            instance.save()
+            rf_instance = form.cleaned_data['requested_friend']
+            friendships.send_request(user, rf_instance)
             return redirect('request-friend') 
     
     else:
         form = FriendRequestForm(request.user) 
 
-    requested_friends = FriendRequest.objects.filter(user=request.user).filter(confirmed_request=False)
+    requested_friends = FriendRequest.objects.select_related('requested_friend__profile').filter(user=request.user).filter(confirmed_request=False)
     
     context = {
         'requested_friends': requested_friends,
+        'suggestions': suggestions.suggest(request.user),
         'form': form,
         'title': "Új barátok keresése"
     }  
@@ -135,16 +135,36 @@ def request_friend(request):
 
 
 
+# the users matching the beginning of a username or name, for the request form
+
+@login_required
+def request_friend_autocomplete(request):
+    users = suggestions.autocomplete(request.user, request.GET.get('q', ''))
+    results = [{'username': user.username, 'name': f'{user.last_name} {user.first_name}'.strip()} for user in users]
+    return JsonResponse({'results': results})
+
+
+
+# live updates (see live.py): the SSE stream is served by the ASGI middleware, this view
+# only answers when it isn't installed, and the 204 makes the page fall back to polling
+# the counter (answered at once, the page asks again every live.POLL_INTERVAL seconds)
+
+def live_events(request):
+    return HttpResponse(status=204)
+
+
+@login_required
+def live_poll(request):
+    return JsonResponse({'unread': live.unread_count(request.user.pk), 'interval': live.POLL_INTERVAL})
+
+
+
 @login_required
 def myfriends(request):
-    friendship_list = Friendship.objects.filter(Q(confirmed_user=request.user) | Q(requested_user=request.user))
-    cu_list = list(friendship_list.values_list('confirmed_user', flat=True))
-    ru_list = list(friendship_list.values_list('requested_user', flat=True))
-    merged_list = cu_list + ru_list
-    friends = sorted(User.objects.filter(id__in=merged_list).exclude(username=request.user), key=lambda x: (c.sort_key(x.username)))
+    friend_list = collation.sort_objects(User.objects.filter(id__in=friends.friend_ids(request.user)).select_related('profile'), lambda x: x.username)
     
     context = {
-        'friends': friends,
+        'friends': friend_list,
         'title': "Barátaim",  
     }  
 
@@ -162,10 +182,7 @@ def delete_friend(request, pk):
             user = request.user
             user_to_handle = form.cleaned_data['user_to_handle']
             deleted_user = User.objects.get(username=user_to_handle)
-            friendship_to_delete = Friendship.objects.filter(Q(confirmed_user=user, requested_user=deleted_user) | Q(confirmed_user=deleted_user, requested_user=user)).get()
-            friendship_to_delete.delete()
-            rf = FriendRequest.objects.filter(Q(user=user, requested_friend=deleted_user) | Q(user=deleted_user, requested_friend=user)).get()
-            rf.delete()
+            friendships.unfriend(user, deleted_user)
             messages.success(request, f'Sikeresen törölted a barátaid közül: {deleted_user}')
             return redirect('myfriends')
 
@@ -193,8 +210,7 @@ def withdraw_request(request, pk):
             user = request.user
             user_to_handle = form.cleaned_data['user_to_handle']
             rf_to_withdraw = User.objects.get(username=user_to_handle)
-            fr_instance = FriendRequest.objects.get(user=user, requested_friend=rf_to_withdraw)
-            fr_instance.delete()
+            friendships.withdraw(user, rf_to_withdraw)
             messages.success(request, 'Sikeresen visszavontad a jelölésedet.')
             return redirect('request-friend')
 
@@ -224,30 +240,25 @@ def friend_notif(request):
             if user_to_handle.startswith('c'):
                 uth = user_to_handle[1:]
                 cu_instance = User.objects.get(username=uth)
-                instance = Friendship(confirmed_user=cu_instance, requested_user=user)
-                instance.save()
-                fr = FriendRequest.objects.get(user=cu_instance, requested_friend=user)
-                fr.confirmed_request = True
-                fr.save()
+                try:
+                    friendships.confirm(user, cu_instance)
+                except IntegrityError:      # the friendship already exists (e.g. the form was sent twice)
+                    messages.error(request, 'Valami hiba történt...')
+                    return redirect('friend-notif')
                 messages.success(request, f'{uth} és Te mostantól barátok vagytok.')
                 return redirect('friend-notif')
 
             elif user_to_handle.startswith('r'):
                 uth = user_to_handle[1:]
                 rejected = User.objects.get(username=uth)
-                instance = RejectedFriendship(rejecter=user, rejected=rejected)
-                instance.save()
-                fr = FriendRequest.objects.get(user=rejected, requested_friend=user)
-                fr.delete()
+                friendships.reject(user, rejected)
                 messages.success(request, f'{uth} barátnak jelölését sikeresen visszautasítottad.')
                 return redirect('friend-notif')
 
             elif user_to_handle.startswith('d'):
                 uth = user_to_handle[1:]
                 rejecter = User.objects.get(username=uth)
-                rej_fs = RejectedFriendship.objects.get(rejecter=rejecter, rejected=user)
-                rej_fs.notif_deleted = True    # maybe the instance should be deleted instead of this
-                rej_fs.save()
+                friendships.dismiss_rejection(user, rejecter)
                 return redirect('friend-notif')
 
             else:
@@ -260,12 +271,11 @@ def friend_notif(request):
     else:
         form = RequestManagementForm()
 
-    requests = FriendRequest.objects.filter(requested_friend=request.user).filter(confirmed_request=False)
-    rejected_requests = RejectedFriendship.objects.filter(rejected=request.user).filter(notif_deleted=False)
+    unread = notifications.unread(request.user)
 
     context = {
-        'requests': requests,
-        'rejected_requests': rejected_requests,
+        'requests': unread[Notification.FRIEND_REQUEST],
+        'rejected_requests': unread[Notification.REJECTED_REQUEST],
         'title': 'Értesítések'
     }
 
@@ -278,23 +288,28 @@ def friend_notif(request):
 @login_required
 def index(request):
     
-    num_books = Book.objects.filter(owner=request.user, owner_nonuser__isnull=True).count()
-    loaned_books = Book.objects.filter(owner=request.user).filter(loaned=True).count()
-    borrowed_books_fromuser = Book.objects.filter(borrower=request.user).count()
-    borrowed_books_fromnonuser = Book.objects.filter(owner=request.user, owner_nonuser__isnull=False).count()
-    borrowed_books = borrowed_books_fromuser + borrowed_books_fromnonuser
-    friends = Friendship.objects.filter(Q(confirmed_user=request.user) | Q(requested_user=request.user))
-    num_friends = friends.count()
-    num_req_friend = FriendRequest.objects.filter(user=request.user, confirmed_request=False).count()
-    num_requests = FriendRequest.objects.filter(requested_friend=request.user, confirmed_request=False).count()
+    user = request.user
+    # all counters come from one query per table (conditional aggregation)
+    book_counts = Book.objects.filter(Q(owner=user) | Q(borrower=user)).aggregate(
+        num_books=Count('book_id', filter=Q(owner=user, owner_nonuser__isnull=True)),
+        loaned_books=Count('book_id', filter=Q(owner=user, loaned=True)),
+        borrowed_books_fromuser=Count('book_id', filter=Q(borrower=user)),
+        borrowed_books_fromnonuser=Count('book_id', filter=Q(owner=user, owner_nonuser__isnull=False)),
+    )
+    request_counts = FriendRequest.objects.filter(Q(user=user) | Q(requested_friend=user), confirmed_request=False).aggregate(
+        num_req_friend=Count('id', filter=Q(user=user)),
+        num_requests=Count('id', filter=Q(requested_friend=user)),
+    )
+    borrowed_books = book_counts['borrowed_books_fromuser'] + book_counts['borrowed_books_fromnonuser']
+    num_friends = len(friends.friend_ids(user))
 
     context = {
-        'num_books': num_books,
-        'loaned_books': loaned_books,
+        'num_books': book_counts['num_books'],
+        'loaned_books': book_counts['loaned_books'],
         'borrowed_books': borrowed_books,
         'num_friends': num_friends,
-        'num_req_friend': num_req_friend,
-        'num_requests': num_requests,
+        'num_req_friend': request_counts['num_req_friend'],
+        'num_requests': request_counts['num_requests'],
         'title': 'Home'    
     }
 
@@ -324,6 +339,45 @@ def book_create_form(request):
 
 
 
+@login_required
+def book_import(request):
+    result = None
+    if request.method == 'POST':
+        form = BookImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = importer.import_uploaded_file(request.user, form.cleaned_data['file'])
+            except (ValueError, csv.Error):
+                messages.error(request, 'A fájlt nem sikerült beolvasni.')
+            else:
+                messages.success(request, f'Sikeresen importáltál {result.created} könyvet.')
+
+    else:
+        form = BookImportForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'columns': importer.COLUMNS,
+        'title': 'Könyvek importálása'
+    }
+
+    return render(request, 'book_import.html', context=context)
+
+
+
+@login_required
+def mybooks_export(request):
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in exporter.FORMATS:
+        raise Http404('Ismeretlen formátum.')
+
+    response = StreamingHttpResponse(exporter.export_books(request.user, file_format), content_type=exporter.FORMATS[file_format])
+    response['Content-Disposition'] = f'attachment; filename="konyveim.{file_format}"'
+    return response
+
+
+
 @login_required
 def book_of_nonuser_create_form(request):
     if request.method == 'POST':
@@ -389,7 +443,7 @@ def book_of_nonuser_update_form(request, pk):
     return render(request, 'book_of_nonuser_form.html', context=context)
 
 
-class MyBooksAllListView(LoginRequiredMixin,generic.ListView): 
+class MyBooksAllListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView): 
     model = Book
     context_object_name = 'my_book_list'   
     template_name = 'catalog/my_book_list.html'
@@ -397,7 +451,7 @@ class MyBooksAllListView(LoginRequiredMixin,generic.ListView):
 
 
     def get_queryset(self):
-        books = sorted(Book.objects.filter(owner=self.request.user).filter(owner_nonuser__isnull=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.filter(owner=self.request.user).filter(owner_nonuser__isnull=True).order_by('sort_key', 'book_id') 
         return books 
 
     def get_context_data(self, **kwargs):
@@ -407,14 +461,14 @@ class MyBooksAllListView(LoginRequiredMixin,generic.ListView):
 
 
 
-class MyBooksRecommendedListView(LoginRequiredMixin,generic.ListView):
+class MyBooksRecommendedListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = 'my_recom_books'  
     template_name = 'catalog/my_recom_books.html'
     paginate_by = 50
 
     def get_queryset(self):
-        books = sorted(Book.objects.filter(owner=self.request.user).filter(recommended=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.filter(owner=self.request.user).filter(recommended=True).order_by('sort_key', 'book_id') 
         return books 
 
     def get_context_data(self, **kwargs):
@@ -424,31 +478,33 @@ class MyBooksRecommendedListView(LoginRequiredMixin,generic.ListView):
 
 
 
-class MyBooksLoanedListView(LoginRequiredMixin,generic.ListView):
+class MyBooksLoanedListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = 'my_loaned_books'  
     template_name = 'catalog/my_loaned_books.html'
     paginate_by = 50
 
     def get_queryset(self):
-        books = sorted(Book.objects.filter(owner=self.request.user).filter(loaned=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.with_borrower().filter(owner=self.request.user).filter(loaned=True).order_by('sort_key', 'book_id') 
         return books 
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = "Kölcsönadott könyveim"
+        context['overdue_loans'] = Loan.objects.filter(owner=self.request.user).overdue().select_related('book', 'borrower').order_by('loan_date')
+        context['overdue_days'] = Loan.overdue_days()
         return context
 
 
 
-class MyBooksWishedListView(LoginRequiredMixin,generic.ListView):
+class MyBooksWishedListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = 'my_wished_books'  
     template_name = 'catalog/my_wished_books.html'
     paginate_by = 50
 
     def get_queryset(self):
-        books = sorted(Book.objects.filter(owner=self.request.user).filter(wished=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
+        books = Book.objects.filter(owner=self.request.user).filter(wished=True).order_by('sort_key', 'book_id')
         return books
 
     def get_context_data(self, **kwargs):
@@ -457,8 +513,47 @@ class MyBooksWishedListView(LoginRequiredMixin,generic.ListView):
         return context
 
 
+class WishedMatchesListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+    model = Book
+    context_object_name = 'wished_matches'
+    template_name = 'catalog/wished_matches.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return matching.wished_matches(self.request.user)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, books, is_paginated = super().paginate_queryset(queryset, page_size)
+        books = matching.attach_lenders(books, self.request.user)
+        if page is not None:
+            page.object_list = books
+        return (paginator, page, books, is_paginated)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['title'] = "Kívánságlistám - barátaimnál megvan"
+        return context
+
+
 class BookDetailView(generic.DetailView):
     model = Book
+    queryset = Book.objects.with_borrower().select_related('genre', 'language')
+
+
+class BookSearchListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+    model = Book
+    context_object_name = 'found_books'
+    template_name = 'catalog/book_search.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return search.search_books(self.request.user, self.request.GET.get('q', ''))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['q'] = self.request.GET.get('q', '')
+        context['title'] = "Keresés"
+        return context
 
 
 class BorrowedBooksByUserListView(LoginRequiredMixin,generic.ListView):
@@ -468,13 +563,14 @@ class BorrowedBooksByUserListView(LoginRequiredMixin,generic.ListView):
     paginate_by = 50
     
     def get_queryset(self):
-        books = sorted(Book.objects.filter(borrower=self.request.user), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.for_listing().filter(borrower=self.request.user).order_by('sort_key', 'book_id') 
         return books
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = "Kölcsönkért könyvek"
-        context['books_of_nonusers'] = sorted(Book.objects.filter(owner=self.request.user).filter(owner_nonuser__isnull=False), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
+        context['books_of_nonusers'] = Book.objects.for_listing().filter(owner=self.request.user).filter(owner_nonuser__isnull=False).order_by('sort_key', 'book_id')
+        context['overdue_book_ids'] = set(Loan.objects.filter(borrower=self.request.user).overdue().values_list('book_id', flat=True))
         return context
 
         
@@ -502,165 +598,62 @@ class BookOfNonUserDelete(LoginRequiredMixin, DeleteView):
 
 
 
-class RecommendedBooksByOwnerListView(LoginRequiredMixin,generic.ListView):
-    model = Book
-    context_object_name = 'recom_books'   
-    template_name = 'catalog/recom_books_byowner.html'
-    paginate_by = 50
-
-    def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(recommended=True), key=lambda x: (c.sort_key(x.owner.username), c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Ajánlott könyvek - barátok szerint rendezve"
-        return context
-
-
-
-class RecommendedBooksByAuthorListView(LoginRequiredMixin,generic.ListView):
+class FriendFeedListView(LoginRequiredMixin, FeedCacheMixin, KeysetPaginationMixin, generic.ListView):
+    # the recommended/wished books of friends, configured in urls.py (see catalog/feeds.py)
     model = Book
-    context_object_name = 'recom_books'  
-    template_name = 'catalog/recom_books_byauthor.html'
     paginate_by = 50
+    feed = None
+    title = None
 
     def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(recommended=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
+        return self.feed.books(self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['title'] = "Ajánlott könyvek - szerző szerint rendezve"
+        context['title'] = self.title
         return context
 
 
 
-class RecommendedBooksByLanguageListView(LoginRequiredMixin,generic.ListView):
-    model = Book
-    context_object_name = 'recom_books'  
-    template_name = 'catalog/recom_books_bylang.html'
-    paginate_by = 50
-
-    def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(recommended=True), key=lambda x: (c.sort_key(x.language.name), c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Ajánlott könyvek - nyelvek szerint rendezve"
-        return context
-
-
-class RecommendedBooksByGenreListView(LoginRequiredMixin,generic.ListView):
-    model = Book
-    context_object_name = 'recom_books'   
-    template_name = 'catalog/recom_books_bygenre.html'
-    paginate_by = 50
-
-    def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(recommended=True), key=lambda x: (c.sort_key(x.genre.name), c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Ajánlott könyvek - műfaj szerint rendezve"
-        return context
-
-
-
-class WishedBooksByOwnerListView(LoginRequiredMixin,generic.ListView):
-    model = Book
-    context_object_name = 'wished_books'   
-    template_name = 'catalog/wished_books_byowner.html'
-    paginate_by = 50
-
-    def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(wished=True), key=lambda x: (c.sort_key(x.owner.username), c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Kívánságlisták - barát szerint rendezve"
-        return context
-
-
-
-class WishedBooksByAuthorListView(LoginRequiredMixin,generic.ListView):
-    model = Book
-    context_object_name = 'wished_books'   
-    template_name = 'catalog/wished_books_byauthor.html'
-    paginate_by = 50
-
-    def get_queryset(self):
-        friend_list = Friendship.objects.filter(Q(confirmed_user=self.request.user) | Q(requested_user=self.request.user))
-        cu_list = list(friend_list.values_list('confirmed_user', flat=True))
-        ru_list = list(friend_list.values_list('requested_user', flat=True))
-        merged_list = cu_list + ru_list
-        books = sorted(Book.objects.filter(owner__id__in=merged_list).exclude(owner=self.request.user).filter(wished=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title)))
-        return books
-
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['title'] = "Kívánságlisták - szerző szerint rendezve"
-        return context
-
-
-
-
-class FriendRecommendedBooksListView(LoginRequiredMixin,generic.ListView):
+class FriendRecommendedBooksListView(LoginRequiredMixin, FeedCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = 'friend_recom_books'  
     template_name = 'catalog/friend_recom_books.html'
     paginate_by = 50
 
+    def get_feed_owner_ids(self):
+        return User.objects.filter(username=self.kwargs.get('username')).values_list('id', flat=True)
+
     def get_queryset(self):
         friend = get_object_or_404(User, username=self.kwargs.get('username'))
-        books = sorted(Book.objects.filter(owner=friend).filter(recommended=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.for_listing().filter(owner=friend).filter(recommended=True).order_by('sort_key', 'book_id') 
         return books 
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        friend = get_object_or_404(User, username=self.kwargs.get('username'))
+        friend = get_object_or_404(User.objects.select_related('profile'), username=self.kwargs.get('username'))
         context['friend'] = friend
         context['title'] = f'{friend} ajánlott könyvei'
         return context
 
 
-class FriendWishedBooksListView(LoginRequiredMixin,generic.ListView):
+class FriendWishedBooksListView(LoginRequiredMixin, FeedCacheMixin, KeysetPaginationMixin, generic.ListView):
     model = Book
     context_object_name = 'friend_wished_books'  
     template_name = 'catalog/friend_wished_books.html'
     paginate_by = 50
 
+    def get_feed_owner_ids(self):
+        return User.objects.filter(username=self.kwargs.get('username')).values_list('id', flat=True)
+
     def get_queryset(self):
         friend = get_object_or_404(User, username=self.kwargs.get('username'))
-        books = sorted(Book.objects.filter(owner=friend).filter(wished=True), key=lambda x: (c.sort_key(x.last_name_author), c.sort_key(x.first_name_author), c.sort_key(x.title))) 
+        books = Book.objects.for_listing().filter(owner=friend).filter(wished=True).order_by('sort_key', 'book_id') 
         return books
 
     def get_context_data(self, **kwargs):  
         context = super().get_context_data(**kwargs)
-        friend = get_object_or_404(User, username=self.kwargs.get('username'))
+        friend = get_object_or_404(User.objects.select_related('profile'), username=self.kwargs.get('username'))
         context['friend'] = friend
         context['title'] = f'{friend} kívánságlistája'
         return context
\ No newline at end of file